@@ -5,6 +5,7 @@ import numpy as np
 from camera import Camera
 
 import udSDK
+import udSDKRender
 
 udSDK.LoadUdSDK("")
 from sys import argv
@@ -38,23 +39,25 @@ class LocalMap():
 
         settings = udSDK.udRenderSettings()
         settings.flags = udSDK.udRenderContextFlags.BlockingStreaming
-        self.renderContext.render(self.renderTarget, [self.renderInstance], renderSettings=settings)
-        self.renderContext.render(self.renderTarget, [self.renderInstance], renderSettings=settings)
-        self.renderContext.render(self.renderTarget, [self.renderInstance], renderSettings=settings)
+        return self.renderContext.render_until_converged(self.renderTarget, [self.renderInstance],
+                                                         renderSettings=settings, timeBudget=5)
 
     def make_estimate_depth(self, pose):
         """Given an estimated position, return the expected depth map for that pose"""
         self.do_render(pose)
-        a = np.array(self.renderTarget.depthBuffer)
-        a.resize([self.renderTarget.height, self.renderTarget.width])
-        return a
+        # copied as the view of the buffer is overwritten by the next render
+        return self.renderTarget.depth_array().copy()
+
+    def make_estimate_points(self, pose, stride=1):
+        """Given an estimated position, return the world space points of the surface visible from that pose"""
+        self.do_render(pose)
+        points, valid = self.renderTarget.unproject_depth(stride=stride)
+        return points[valid]
 
     def make_estimate_colour(self, pose):
         """Given an estimated position, return the expected depth map for that pose"""
         self.do_render(pose)
-        a = np.array(self.renderTarget.rgb_colour_buffer(), dtype=np.uint8)
-        a.resize([self.renderTarget.height,self.renderTarget.width, 3])
-        return a
+        return np.ascontiguousarray(self.renderTarget.colour_array("RGB"))
 
     def make_estimate_canny(self, pose, blurK=9, cannyLower=100, cannyUpper=200):
         colour = self.make_estimate_colour(pose)
@@ -205,6 +208,13 @@ class ParticleFilter():
         #Initialise the filter as having a uniform distribution over the bounding box
         #of the localMap:
         self.localMap.camera.set_projection_perspective(far=200, near=0.1)
+        settings = udSDK.udRenderSettings()
+        settings.flags = udSDK.udRenderContextFlags.BlockingStreaming
+        # renders the hypotheses with the same view and settings as LocalMap.do_render:
+        self.batchRenderer = udSDKRender.udBatchRenderer(localMap.udContext, localMap.renderTarget.width,
+                                                         localMap.renderTarget.height, workers=4, passes=3,
+                                                         renderSettings=settings,
+                                                         projectionMatrix=localMap.renderTarget.projectionMatrix)
         self.poseEstimates = []
         #bboxMax = [(localMap.model.header.boundingBoxExtents[i] + localMap.model.header.boundingBoxCenter[i]) * localMap.model.header.scaledRange for i in range(3)]
         #bboxMin = [(localMap.model.header.boundingBoxExtents[i] - localMap.model.header.boundingBoxCenter[i]) * localMap.model.header.scaledRange for i in range(3)]
@@ -236,11 +246,12 @@ class ParticleFilter():
         pass
 
     def evaluate_scores(self, imOther:np.array):
-        i=0
-        for hypothesis in self.poseEstimates:
-            #print(f"Processing guess {i}")
-            i = i+1
-            hypothesis.evaluate_score(localMap=self.localMap, other=imOther)
+        # the camera matrices of the hypotheses, positioned with no rotation as in PoseEstimate.evaluate_score:
+        cameraMatrices = np.tile(np.eye(4), (len(self.poseEstimates), 1, 1))
+        cameraMatrices[:, 3, :3] = [hypothesis.position for hypothesis in self.poseEstimates]
+        renders = self.batchRenderer.render_iter([self.localMap.renderInstance], cameraMatrices)
+        for i, depth, colour in renders:
+            self.poseEstimates[i].score = np.abs(depth - imOther).sum()
 
     def show_guesses(self):
         import matplotlib.pyplot as plt
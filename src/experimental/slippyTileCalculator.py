@@ -6,11 +6,14 @@ import os
 import udSDK
 
 udSDK.LoadUdSDK("")
+import udSDKCatalog
 
 context = udSDK.udContext()
 context.log_in_interactive()
 z54Base = "M:/ELVIS/z54_towns_colour/"
 z55Base = "M:/ELVIS/z55_towns_colour/"
+# the headers of the tiles are recorded here so that only new or modified tiles are opened on subsequent runs
+catalogPath = "M:/ELVIS/catalog.json"
 
 
 def calculateApproxTileNumber(baseDirs):
@@ -20,13 +23,13 @@ def calculateApproxTileNumber(baseDirs):
   tileWidth = C * math.cos(lat * math.pi/180) / (2**zoomLevel)
   tileArea = tileWidth**2
   totalArea = 0
-  for dir in baseDirs:
-    for f in os.listdir(dir,):
-      pc = udSDK.udPointCloud(dir + f, context)
-      size = [0, 0, 0]
-      for i in range(3):
-        size[i] = pc.header.boundingBoxExtents[i] * pc.header.scaledRange
-      totalArea += size[0] * size[1]
+  catalog = udSDKCatalog.udCatalog(catalogPath)
+  catalog.refresh(baseDirs, context, recursive=False)
+  for model in catalog:
+    if not any(model["path"].startswith(os.path.normcase(os.path.abspath(dir))) for dir in baseDirs):
+      continue
+    size = [model["maximum"][i] - model["minimum"][i] for i in range(3)]
+    totalArea += size[0] * size[1]
   return totalArea/tileArea
 
 print(calculateApproxTileNumber([z54Base, z55Base]))
@@ -0,0 +1,56 @@
+"""
+Benchmark of the throughput of udParallelQuery as the number of worker threads increases.
+The whole of the model is queried with each worker count and the number of points returned per second is reported
+"""
+import os
+import time
+from os.path import abspath
+from sys import argv
+
+import udSDK
+
+udSDK.LoadUdSDK("")
+import udSDKQuery
+import sampleLogin
+
+modelFile = abspath("./samplefiles/DirCube.uds")
+
+
+def time_query(context, model, workers, tiles):
+  """
+  runs a query of the whole model with the given number of workers, returning (number of points, seconds taken)
+  """
+  query = udSDKQuery.udParallelQuery(context, model, tiles=tiles, workers=workers, batchSize=100000)
+  start = time.perf_counter()
+  nPoints = 0
+  for positions, attributes in query.iter_batches(ordered=False):
+    nPoints += len(positions)
+  return nPoints, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+  if len(argv) >= 2:
+    modelFile = abspath(argv[1])
+
+  context = udSDK.udContext()
+  sampleLogin.log_in_sample(context)
+  model = udSDK.udPointCloud(modelFile, context)
+
+  maxWorkers = os.cpu_count()
+  tiles = (8, 8, 1)
+  workerCounts = [1]
+  while workerCounts[-1] * 2 <= maxWorkers:
+    workerCounts.append(workerCounts[-1] * 2)
+
+  # the tiles must return each point exactly once for the rates to be comparable with a serial query:
+  nTotal = udSDKQuery.udParallelQuery(context, model, tiles=tiles, workers=maxWorkers).check_tiling()
+  print(f"tiling checked: {nTotal} points")
+
+  baseline = None
+  print(f"{'workers':>8} {'points':>12} {'seconds':>9} {'points/s':>12} {'speedup':>8}")
+  for workers in workerCounts:
+    nPoints, seconds = time_query(context, model, workers, tiles)
+    rate = nPoints / seconds if seconds else float('inf')
+    if baseline is None:
+      baseline = rate
+    print(f"{workers:>8} {nPoints:>12} {seconds:>9.3f} {rate:>12.0f} {rate / baseline:>8.2f}")
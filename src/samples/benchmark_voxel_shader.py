@@ -0,0 +1,84 @@
+"""
+Benchmark of Python voxel shaders. The greyscale intensity shader of voxel_shaders.py is rendered once resolving the
+point cloud and attribute for every voxel, and once through udSDK.udVoxelShaderRuntime, reporting voxels shaded per
+second for each
+"""
+import time
+from os.path import abspath
+from sys import argv
+
+import udSDK
+# importing the shaders also loads udSDK:
+from voxel_shaders import userDataType, voxel_shader_intensity, voxel_shader_intensity_lut
+import sampleLogin
+
+modelFile = abspath("./samplefiles/DirCube.uds")
+
+width = 1280
+height = 720
+
+cameraMatrix = [1, 0, 0, 0,
+                0, 1, 0, 0,
+                0, 0, 1, 0,
+                0, -5, 0, 1]
+
+
+def counted(shader, counter):
+  """
+  wraps shader so that the number of voxels shaded is recorded in counter
+  """
+  def ret(*args):
+    counter[0] += 1
+    return shader(*args)
+  return ret
+
+
+def time_render(renderer, renderView, renderInstance, passes=3):
+  """
+  renders renderInstance passes times, returning (voxels shaded, seconds spent rendering)
+  """
+  counter = [0]
+  renderInstance.voxelShader = counted(renderInstance.voxelShader, counter)
+  start = time.perf_counter()
+  for i in range(passes):
+    renderer.render(renderView, [renderInstance])
+  return counter[0], time.perf_counter() - start
+
+
+if __name__ == "__main__":
+  if len(argv) >= 2:
+    modelFile = abspath(argv[1])
+
+  context = udSDK.udContext()
+  sampleLogin.log_in_sample(context)
+  renderer = udSDK.udRenderContext(context)
+  renderView = udSDK.udRenderTarget(width, height, 0, context, renderer)
+  renderView.cameraMatrix = cameraMatrix
+  renderView.renderSettings.flags = udSDK.udRenderContextFlags.BlockingStreaming
+  model = udSDK.udPointCloud(modelFile, context)
+  if "udIntensity" not in model.header.attributes.names:
+    raise SystemExit("model has no intensity channel")
+
+  # per voxel resolution of the point cloud and attribute:
+  instance = udSDK.udRenderInstance(model)
+  instance.scaleMode = "minDim"
+  userData = userDataType()
+  userData.rangeMin = 0
+  userData.rangeMax = 2**8 - 1
+  instance.voxelShader = voxel_shader_intensity
+  instance.voxelShaderData = userData
+  renderer.render(renderView, [instance])  # the first render streams the model in
+  before = time_render(renderer, renderView, instance)
+
+  # prebound reader and precomputed colour ramp:
+  instance = udSDK.udRenderInstance(model)
+  instance.scaleMode = "minDim"
+  runtime = instance.set_attribute_shader(voxel_shader_intensity_lut, "udIntensity",
+                                          udSDK.udVoxelShaderRuntime.colour_ramp(0, 2**8 - 1))
+  after = time_render(renderer, renderView, instance)
+
+  print(f"{'shader':>10} {'voxels':>12} {'seconds':>9} {'voxels/s':>12}")
+  for name, (voxels, seconds) in (("per voxel", before), ("runtime", after)):
+    print(f"{name:>10} {voxels:>12} {seconds:>9.3f} {voxels / seconds if seconds else float('inf'):>12.0f}")
+  if before[1] and after[1]:
+    print(f"speedup: {(after[0] / after[1]) / (before[0] / before[1]):.2f}x")
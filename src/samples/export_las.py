@@ -26,27 +26,30 @@ def export_tiles(divX=2, divY=2, divZ=1, previewOnly=False):
   # the centre of the lower left octant
   lowerLeft = [modelCentre[i] - f.size[i] * (nDivs[i] - 1) for i in range(2)]
   lowerLeft.append(modelCentre[2])
-  points = udSDK.udPointBufferF64(10000, attributeSet=model.header.attributes)
   pathlib.Path(f"./{modelName}").mkdir(parents=True, exist_ok=True)
+  tiles = {}
   for i in range(nDivs[0]):
     for j in range(nDivs[1]):
       for k in range(nDivs[2]):
-        f.position = [
+        position = [
           i * f.size[0] * 2 + lowerLeft[0],
           j * f.size[1] * 2 + lowerLeft[1],
           k * f.size[2] * 2 + lowerLeft[2],
           ]
-        # here we use query to check if there are any points enclosed in our volume - if not we don't add the volume to
-        # the scene
-        query = udSDK.udQueryContext(context, model, f)
-        if not query.execute(points):
-          continue
+        tiles[(i, j, k)] = udSDKGeometry.udGeometryOBB(position=position, size=f.size)
 
-        if not previewOnly:
-          model.export(abspath("output/{modelName}/tile{i}_{j}_{k}.las"), f)
+  # here we probe each tile to check if there are any points enclosed in our volume - if not we don't add the volume to
+  # the scene. Tiles outside the model bounds are rejected without querying and a single query is reused for the rest
+  occupied = model.probe_tiles(tiles.values(), context)
+  for ((i, j, k), tile), hasPoints in zip(tiles.items(), occupied):
+    if not hasPoints:
+      continue
 
-        node = f.as_scene_node(scene.rootNode)
-        node.name = f"tile{i}_{j}_{k}"
+    if not previewOnly:
+      model.export(abspath("output/{modelName}/tile{i}_{j}_{k}.las"), tile)
+
+    node = tile.as_scene_node(scene.rootNode)
+    node.name = f"tile{i}_{j}_{k}"
   scene.save()
 
 if __name__ == "__main__":
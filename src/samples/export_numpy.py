@@ -5,6 +5,7 @@ This example show querying a subset of a uds file into a python environment and
 import udSDK
 import udSDKScene
 import udSDKGeometry
+import udSDKQuery
 import sampleLogin
 from os.path import abspath
 
@@ -56,6 +57,10 @@ def udRGBA_to_tuple(colour):
 #you will probably run out of memory if you do this:
 #query.load_all_points(bufferSize=8000000)
 
+#instead, queries of any size can be processed in batches using a fixed set of buffers:
+#for positions, attributes in query.iter_batches(batchSize=1000000):
+#  process(positions, attributes)
+
 #currently we only take the first buffer as being all the points -this will not be true if buffersize > number of points in selection
 #from here we can use the points however we like, for example by drawing them in matplotlib:
 def visualizeInMatPlotLib(resultBuffer, everyNth=1000, attribute='udRGB'):
@@ -98,10 +103,23 @@ udRGBIterator = resultBuffer.attrAccessors.get("udRGB")
 if udRGBIterator is not None:
   print(f"accessing RGB values:")
   #indexing, iteration, slicing and negative indices are supported
+  #slices are read as numpy arrays and can be assigned from arrays, scalars or boolean masks in a single operation
   print(f"elements 0:5 = {[*udRGBIterator[0:5]]}")
   print("zeroing elements 4 and 5 of the buffer:")
   udRGBIterator[3:5] = [0, 0]
   print(f"elements 0:5 = {[*udRGBIterator[0:5]]}")
   print(f"elements -1:-2 = {[*udRGBIterator[-1:-2:-1]]}")
 
+#attributes can also be accessed as numpy arrays mapped directly onto the buffer memory:
+print(f"attribute layout: {resultBuffer.attributeDtype}")
+for name in resultBuffer.attributeDtype.names:
+  column = resultBuffer.get_attribute_array(name)
+  print(f"{name}: min {column.min(axis=0)} max {column.max(axis=0)}")
+
 visualizeInMatPlotLib(resultBuffer,50)
+
+#for previews, a voxel grid keeps one point per cell of the query without holding every point in memory:
+previewQuery = udSDK.udQueryContext(context, model, f)
+decimator = previewQuery.reduce(udSDKQuery.udVoxelGridDecimator(model.header, cellSize=1.0, blend=True))
+previewPositions, previewAttributes = decimator.result()
+print(f"{len(previewPositions)} points in the 1m voxel grid preview")
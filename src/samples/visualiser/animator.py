@@ -2,7 +2,12 @@
 module containing logic associated with automated placement, scaling and rotation
 of UDS files over time
 """
+import numpy as np
 import pyglet
+
+import udSDK
+
+
 class UDSAnimator:
     """
     Class defining automated movement of renderInstances
@@ -11,6 +16,11 @@ class UDSAnimator:
     def __init__(self):
         #mapping of instances to the animating function(s)
         self.dispatchList = {}
+        #spinning instances are rotated together in a single vectorised update:
+        self.spinningInstances = []
+        self.angularVelocities = np.zeros((0, 3))
+        self._spinArray = None
+        self._spinLists = []
         self.running = False
         self.interval = 1/20 #frequency of calls in seconds
         self.start()
@@ -28,19 +38,51 @@ class UDSAnimator:
             self.start()
 
     def spin_instance(self, instance, angularVelocity=[0,0,0.1]):
-        def ret(dt):
-            dAngle = [angularVelocity[0]*dt, angularVelocity[1]*dt, angularVelocity[2]*dt]
-            r1, r2, r3 = instance.rotation
-            instance.rotation = (r1+dAngle[0], r2+dAngle[1], r3+dAngle[2])
-        self.dispatchList[id(instance)] = ret
+        if instance in self.spinningInstances:
+            self.angularVelocities[self.spinningInstances.index(instance)] = angularVelocity
+            return
+        self.spinningInstances.append(instance)
+        self.angularVelocities = np.vstack([self.angularVelocities, angularVelocity])
+        #rebuilt with the current transformations of the instances on the next dispatch:
+        self._release_spin_array()
+
+    def stop_spinning(self, instance):
+        i = self.spinningInstances.index(instance)
+        self.spinningInstances.pop(i)
+        self.angularVelocities = np.delete(self.angularVelocities, i, axis=0)
+        self._release_spin_array()
+
+    def _release_spin_array(self):
+        if self._spinArray is not None:
+            self._spinArray.release()
+        self._spinArray = None
+
+    def spin_instances(self, dt):
+        """rotates all spinning instances by their angular velocity over dt seconds"""
+        if not self.spinningInstances:
+            return
+        if self._spinArray is None:
+            self._spinArray = udSDK.udRenderInstanceArray(self.spinningInstances)
+            #the render lists the instances are drawn from:
+            lists = {id(renderList): renderList for instance in self.spinningInstances for renderList in instance._renderLists}
+            self._spinLists = list(lists.values())
+        else:
+            #pick up any changes made to the instances (e.g. position or scale) since the last tick:
+            self._spinArray.reload_changed()
+        self._spinArray.rotate(self.angularVelocities * dt)
+        #the array holds the transformations, the new matrices are written straight into the render lists:
+        for renderList in self._spinLists:
+            self._spinArray.write_back(renderList=renderList)
 
     def dispatch_animations(self, dt):
         """calls all functions queued for dispatch"""
+        self.spin_instances(dt)
         for instanceid in self.dispatchList.keys():
             self.dispatchList[instanceid](dt)
 
     def stop(self):
         pyglet.clock.unschedule(self.dispatch_animations)
+        self._release_spin_array()
         self.running = False
 
     def start(self):
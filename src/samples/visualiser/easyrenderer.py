@@ -11,6 +11,7 @@ import udSDK
 from src.samples import sampleLogin
 SDKPath='./udSDK'
 udSDK.LoadUdSDK(SDKPath)
+import udSDKRender
 
 class UDEasyRenderer():
   def __init__(self,
@@ -23,12 +24,16 @@ class UDEasyRenderer():
     t.start()
 
     self.pointclouds = []
-    self.renderInstances = []
+    # kept in a native array, only instances that have changed are copied before each render:
+    self.renderInstances = udSDK.udRenderInstanceList()
     for model in models:
       self.add_model(model)
 
     self.renderViews = []
     self.renderSettings = {} #list of settings corresponding to each
+    #skip instances outside the view of each render:
+    self.frustumCulling = True
+    self._frameWriter = None
     t.join()
     self.add_view()
 
@@ -75,9 +80,9 @@ class UDEasyRenderer():
 
   def render_view(self, view:udSDK.udRenderTarget):
     try:
-      #This converts our python list into an array of udRenderInstance pointers that can be understood by udSDK:
-      renderInstancesCArray = (udSDK.udRenderInstance * len(self.renderInstances))(*self.renderInstances)
-      self.udRenderer.render(view, renderInstancesCArray, renderSettings=self.renderSettings[view])
+      if self.frustumCulling:
+        udSDKRender.cull_instances(view, self.renderInstances)
+      self.udRenderer.render(view, self.renderInstances, renderSettings=self.renderSettings[view])
     except udSDK.UdException as e:
       logger.log(logging.INFO, 'Render failed: '+e.args[0])
 
@@ -85,16 +90,37 @@ class UDEasyRenderer():
     for view in self.renderViews:
       self.render_view(view)
 
-  def render_to_file(self, outFile: str):
-    for x in range(10):
-      self.render_all()
+  @property
+  def frameWriter(self):
+    """
+    writer encoding frames saved by this renderer to disk in the background
+    """
+    if self._frameWriter is None:
+      self._frameWriter = udSDKRender.udFrameWriter()
+    return self._frameWriter
+
+  def render_to_file(self, outFile: str, wait=True, timeBudget=10.0):
+    """
+    renders every view until streaming has refined it, or for at most timeBudget seconds per view, and writes each to
+    outFile_<view number>.png. The images are encoded in the background, unless wait is set this returns as soon as the
+    views have been rendered
+    """
+    for view in self.renderViews:
+      if self.frustumCulling:
+        udSDKRender.cull_instances(view, self.renderInstances)
+      convergence = self.udRenderer.render_until_converged(view, self.renderInstances, self.renderSettings[view],
+                                                           timeBudget=timeBudget)
+      logger.info(f"rendered view in {convergence.passes} passes, {convergence.elapsed:.2f}s")
     i=0
     for view in self.renderViews:
-      name = outFile + '_'+str(i)+'.png'
-      Image.frombuffer("RGBA", (view.width, view.height), view.colourBuffer, "raw", "RGBA", 0, 1).save(name)
+      self.frameWriter.submit(view, outFile + '_'+str(i))
       i += 1
+    if wait:
+      self.frameWriter.flush()
 
   def __del__(self):
+    if self._frameWriter is not None:
+      self._frameWriter.close()
     for model in self.pointclouds:
       model.Unload()
 
@@ -1,3 +1,4 @@
+import os
 import sys
 import threading
 
@@ -160,23 +161,29 @@ class UDViewPort():
     glDisable(GL_TEXTURE_2D)
 
 
-  def write_to_image(self, name='a.png', flags=None):
-    arr = []
-    #convert colour buffer from BGRA to RGBA
-    #i.e. we are switching the B and R channels by bit shifting
+  def write_to_image(self, name='a.png', flags=None, wait=True):
+    """
+    writes the current view to the PNG file name, returning the path written or None if the frame writer dropped the
+    frame. Unless wait is set this returns before the image has been written
+    """
+    root, extension = os.path.splitext(name)
+    if extension.lower() != '.png':
+      raise ValueError("write_to_image only writes .png files, got {}".format(name))
     oldFlags = self.parent.renderer.renderSettings[self.renderTarget]
     if flags is not None:
       newFlags = flags | oldFlags
       self.parent.renderer.renderSettings[self.renderTarget].flags = newFlags
 
-    for pix in self.renderTarget.colourBuffer:
-      pix = numpy.int32(pix)
-      pix=(pix>>24 & 0xFF)<<24 |(pix>>16 & 0xFF)<<0 |(pix>>8 & 0xFF)<<8 | (pix&0xFF)<<16
-      arr.append(pix)
-    #Image.frombuffer("RGBA", (self.renderTarget.width, self.renderTarget.height), arr, "raw", "RGBA", 0, 1).save(name)
-    arr = numpy.array(arr)
-    Image.frombuffer("RGBA", (self.renderTarget.width, self.renderTarget.height), arr.flatten(), "raw", "RGBA", 0, 1).save(name)
-    #Image.fromarray(arr.flatten(), "RGBA")
+    # the colour buffer is snapshotted, converted from BGRA to RGBA and encoded in the background so rendering can
+    # continue while the image is written
+    frameWriter = self.parent.renderer.frameWriter
+    path = frameWriter.submit(self.renderTarget, root)
+    if path is None:
+      print("frame writer queue full: {} was not written".format(name))
+      return None
+    if wait:
+      frameWriter.flush()
+    return path + '.png'
 
 
 class AppWindow(pyglet.window.Window):
@@ -63,6 +63,15 @@ def voxel_shader_intensity(pPointCloud:ctypes.c_void_p, pVoxelID:ctypes.POINTER(
   return 0xFF000000 | val << 16 | val << 8 | val
 
 
+def voxel_shader_intensity_lut(read, pVoxelID, lut):
+  """
+  The same greyscale intensity shader run through udSDK.udVoxelShaderRuntime: read is bound to the intensity attribute
+  of the model once per render and the greyscale ramp is precomputed in lut, leaving a single lookup per voxel.
+  This is much faster than voxel_shader_intensity
+  """
+  return lut[read(pVoxelID)]
+
+
 if __name__ == "__main__":
 
   # allow the passing of the model as the first argument:
@@ -86,11 +95,9 @@ if __name__ == "__main__":
 
     # check that the pointcloud has the necessary attribute:
     if udModel.header.attributes.names.count("udIntensity"):
-      userData = userDataType()
-      userData.rangeMin = 0
-      userData.rangeMax = 2**8 - 1
-      renderInstance.voxelShader = voxel_shader_intensity
-      renderInstance.voxelShaderData = userData
+      # map intensities from 0 to 255 onto greyscale, this could be replaced with any colour ramp:
+      lut = udSDK.udVoxelShaderRuntime.colour_ramp(0, 2**8 - 1)
+      renderInstance.set_attribute_shader(voxel_shader_intensity_lut, "udIntensity", lut)
     else:
       print("model has no intensity channel: rendering in black")
       renderInstance.voxelShader = voxel_shader_black
@@ -98,9 +105,9 @@ if __name__ == "__main__":
     renderInstances = [renderInstance]
     # set the blocking streaming flag so that the model will refine more quickly (good for offline rendering):
     udRenderView.renderSettings.flags = udSDK.udRenderContextFlags.BlockingStreaming
-    # run a couple of times so that the streamer will fully refine
-    for i in range(2):
-      udRenderer.render(udRenderView, renderInstances)
+    # render until the streamer has fully refined the view:
+    convergence = udRenderer.render_until_converged(udRenderView, renderInstances)
+    print("rendered {0} passes in {1:.2f}s".format(convergence.passes, convergence.elapsed))
 
     Image.frombuffer("RGBA", (width, height), udRenderView.colourBuffer, "raw", "RGBA", 0, 1).save(outFile)
     print("{0} written.".format(outFile))
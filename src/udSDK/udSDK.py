@@ -4,6 +4,10 @@ import logging
 import math
 import os
 import platform
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from enum import IntEnum, unique
 import numpy as np
 
@@ -275,6 +279,18 @@ class udRenderSettings(ctypes.Structure):
     self.pick.x = x
     self.pick.y = y
 
+  def copy(self):
+    """
+    returns new settings with the same flags, point mode and filter as these, and a pick of their own
+    """
+    ret = udRenderSettings()
+    ret.flags = self.flags
+    ret.pointMode = self.pointMode
+    ret.pointCount = self.pointCount
+    ret.pointThreshold = self.pointThreshold
+    ret.geometryFilter = self.geometryFilter
+    return ret
+
   @property
   def geometryFilter(self):
     return self._geometryFilter
@@ -412,6 +428,16 @@ class udAttributeTypeInfo(IntEnum):
     }.get(self.value)
     return ret
 
+  def to_dtype(self):
+    """
+    Returns the equivalent numpy dtype for reading this attribute as part of an array.
+    Types without a ctypes equivalent are returned as raw bytes of the encoded size
+    """
+    ctype = self.to_ctype()
+    if ctype is None:
+      return np.dtype((np.uint8, self.value & self.udATI_SizeMask))
+    return np.dtype(ctype)
+
 
 class udAttributeDescriptor(ctypes.Structure):
   """
@@ -539,6 +565,109 @@ class udAttributeSet(ctypes.Structure):
     """
     return [self.pDescriptors[i].name.decode('utf8') for i in range(self.count)]
 
+  @property
+  def signature(self):
+    """
+    tuple of (name, typeInfo, blendType) of each attribute in the set. Sets with equal signatures describe identical
+    point layouts
+    """
+    return tuple((d.name.decode('utf8'), d.typeInfo, d.blendType) for d in (self.pDescriptors[i] for i in range(self.count)))
+
+  @property
+  def layout(self):
+    """
+    the cached udAttributeLayout of this set
+    """
+    return udAttributeLayout.from_attribute_set(self)
+
+
+udAttributeLayoutEntry = namedtuple("udAttributeLayoutEntry", ["index", "name", "offset", "typeInfo", "ctype", "dtype",
+                                                               "blendType"])
+
+
+class udAttributeLayout:
+  """
+  Immutable description of the position of each attribute of a udAttributeSet within a point, mapping attribute names
+  to udAttributeLayoutEntry(index, name, offset, typeInfo, ctype, dtype, blendType).
+  Layouts are built once per distinct attribute set and shared, so looking up an attribute is a dictionary access rather
+  than a scan of the descriptors and a native offset query.
+  """
+  __slots__ = ("entries", "_byName", "_dtypes")
+  _cache = {}
+
+  def __init__(self, attributeSet: udAttributeSet):
+    entries = []
+    for i in range(len(attributeSet)):
+      descriptor = attributeSet.pDescriptors[i]
+      name = descriptor.name.decode('utf8')
+      typeInfo = udAttributeTypeInfo(descriptor.typeInfo)
+      entries.append(udAttributeLayoutEntry(i, name, attributeSet.get_offset(name), typeInfo, typeInfo.to_ctype(),
+                                            typeInfo.to_dtype(), udAttributeBlendType(descriptor.blendType)))
+    object.__setattr__(self, "entries", tuple(entries))
+    object.__setattr__(self, "_byName", {entry.name: entry for entry in entries})
+    object.__setattr__(self, "_dtypes", {})
+
+  def __setattr__(self, key, value):
+    raise AttributeError("udAttributeLayout is immutable")
+
+  @classmethod
+  def from_attribute_set(cls, attributeSet: udAttributeSet):
+    """
+    returns the shared layout of attributeSet, building it on first use
+    """
+    signature = attributeSet.signature
+    ret = cls._cache.get(signature)
+    if ret is None:
+      ret = cls._cache.setdefault(signature, cls(attributeSet))
+    return ret
+
+  @property
+  def names(self):
+    """
+    list of names of the attributes in the layout
+    """
+    return [entry.name for entry in self.entries]
+
+  def offset(self, attributeName: str):
+    """
+    return the offset in bytes from the beginning of the voxel that this attribute is located at
+    """
+    return self[attributeName].offset
+
+  def dtype(self, itemsize=None):
+    """
+    returns the structured numpy dtype of a single point with the attributes at their offsets. itemsize is the stride
+    between points, by default the end of the last attribute
+    """
+    ret = self._dtypes.get(itemsize)
+    if ret is None:
+      spec = {"names": [e.name for e in self.entries], "formats": [e.dtype for e in self.entries],
+              "offsets": [e.offset for e in self.entries]}
+      if itemsize is not None:
+        spec["itemsize"] = itemsize
+      ret = self._dtypes.setdefault(itemsize, np.dtype(spec))
+    return ret
+
+  def __getitem__(self, item):
+    if type(item) == str:
+      try:
+        return self._byName[item]
+      except KeyError:
+        raise KeyError(f"attribute name {item} not in attributeSet!") from None
+    return self.entries[item]
+
+  def __contains__(self, attributeName):
+    return attributeName in self._byName
+
+  def __iter__(self):
+    return iter(self.entries)
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __repr__(self):
+    return f"udAttributeLayout: {[(e.name, e.offset, e.typeInfo.name) for e in self.entries]}"
+
 
 class udPointCloudHeader(ctypes.Structure):
   """
@@ -556,6 +685,14 @@ class udPointCloudHeader(ctypes.Structure):
               ("boundingBoxExtents", ctypes.c_double * 3)
               ]
 
+  def world_bounds(self):
+    """
+    returns the (minimum, maximum) corners of the axis aligned bounding box of the point cloud in world space
+    """
+    centre = np.array(self.baseOffset) + np.array(self.boundingBoxCenter) * self.scaledRange
+    halfSize = np.array(self.boundingBoxExtents) * self.scaledRange
+    return centre - halfSize, centre + halfSize
+
 
 class udPointCloudLoadOptions(ctypes.Structure):
   """
@@ -569,6 +706,107 @@ class udPointCloudLoadOptions(ctypes.Structure):
 
 VOXELSHADERTYPE = ctypes.CFUNCTYPE(ctypes.c_uint32, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p)
 
+
+class udVoxelAttributeReader:
+  """
+  Reads the value of one attribute of the voxels of a point cloud, intended for use inside voxel shaders.
+  The native function, attribute offset and ctype are resolved once on construction so reading a voxel is a single
+  native call with no allocation of Python wrapper objects
+  """
+  def __init__(self, pointcloud, attributeName: str, default=None):
+    """
+    default is returned for voxels the attribute cannot be read from
+    """
+    attribute = pointcloud.attributeLayout[attributeName]
+    if attribute.ctype is None:
+      raise TypeError(f"attribute {attributeName} of type {attribute.typeInfo} cannot be read")
+    self.attribute = attribute
+    self.default = default
+    self._pPointCloud = pointcloud.pPointCloud.value
+    self._offset = attribute.offset
+    self._ctype = attribute.ctype
+    self._getAddress = pointcloud._attribute_address_function()
+    if issubclass(self._ctype, ctypes.Array):
+      self.read = self._read_array
+
+  def _address(self, pVoxelID):
+    address = ctypes.c_void_p()
+    if self._getAddress(self._pPointCloud, pVoxelID, self._offset, ctypes.byref(address)) != 0:
+      return None
+    return address.value
+
+  def read(self, pVoxelID):
+    """
+    returns the value of the attribute for the voxel at address pVoxelID
+    """
+    address = self._address(pVoxelID)
+    if not address:
+      return self.default
+    return self._ctype.from_address(address).value
+
+  def _read_array(self, pVoxelID):
+    address = self._address(pVoxelID)
+    if not address:
+      return self.default
+    return tuple(self._ctype.from_address(address))
+
+  def __call__(self, pVoxelID):
+    return self.read(pVoxelID)
+
+
+class udVoxelShaderRuntime:
+  """
+  Fast path for voxel shaders written in Python.
+  shader is called for each voxel as shader(read, pVoxelID, lut) where read(pVoxelID) returns the value of the attribute
+  attributeName of the voxel and lut is passed through unchanged, typically a table of colours precomputed with
+  colour_ramp or threshold. The point cloud, attribute offset and type are resolved when the runtime is bound rather
+  than for every voxel, the returned value is the 32 bit ARGB colour of the voxel.
+  """
+  def __init__(self, shader, attributeName: str, lut=None, default=0):
+    """
+    default is the value read for voxels the attribute cannot be read from
+    """
+    self.shader = shader
+    self.attributeName = attributeName
+    self.lut = lut
+    self.default = default
+    self.reader = None
+    self._pPointCloud = None
+
+  def bind(self, pointcloud):
+    """
+    resolves the attribute reader for pointcloud
+    """
+    self.reader = udVoxelAttributeReader(pointcloud, self.attributeName, self.default)
+    self._read = self.reader.read
+    self._pPointCloud = pointcloud.pPointCloud.value
+
+  def __call__(self, pPointCloud, pVoxelID, pUserData):
+    if pPointCloud != self._pPointCloud:
+      self.bind(udPointCloud.from_pointer(ctypes.c_void_p(pPointCloud)))
+    return self.shader(self._read, pVoxelID, self.lut)
+
+  @staticmethod
+  def colour_ramp(rangeMin, rangeMax, colours=((0, 0, 0), (255, 255, 255)), size=1 << 16):
+    """
+    returns a list of size 32 bit ARGB colours indexed by integer attribute value. Values are mapped linearly from
+    rangeMin to rangeMax across the evenly spaced RGB colours and clamped outside that range
+    """
+    colours = np.asarray(colours, dtype=float)
+    t = np.clip((np.arange(size) - rangeMin) / (rangeMax - rangeMin), 0, 1) * (len(colours) - 1)
+    stops = np.arange(len(colours))
+    r, g, b = [np.rint(np.interp(t, stops, colours[:, c])).astype(np.uint32) for c in range(3)]
+    return (0xFF000000 | r << 16 | g << 8 | b).tolist()
+
+  @staticmethod
+  def threshold(threshold, below=0xFF000000, above=0xFFFFFFFF, size=1 << 16):
+    """
+    returns a list of size colours indexed by integer attribute value, below for values less than threshold and above
+    otherwise
+    """
+    return np.where(np.arange(size) < threshold, np.uint32(below), np.uint32(above)).tolist()
+
+
 class udRenderInstance(ctypes.Structure):
   """
 Represents a renderInstance;
@@ -590,6 +828,11 @@ define the properties of the models to be rendered
   rotation = [0, 0, 0]  # the rotation about the point pivot
   scale = [1, 1, 1]  # x, y and z scaling factors
   pivot = [0, 0, 0]  # point to rotate about
+  # native fields whose modification is propagated to the udRenderInstanceLists containing the instance:
+  _trackedFields = frozenset(["pPointCloud", "matrix", "pFilter", "pVoxelShader", "pVoxelUserData", "opacity",
+                              "skipRender"])
+  _renderLists = ()
+  _transformOwner = None  # the udRenderInstanceArray holding the transformation of the instance, if any
 
   def __init__(self, model):
     """
@@ -610,6 +853,37 @@ define the properties of the models to be rendered
     self._voxelShaderData = None
     self._geometryFilter = None
 
+  def __setattr__(self, name, value):
+    super().__setattr__(name, value)
+    if name in self._trackedFields:
+      self._changed()
+
+  def _changed(self):
+    """
+    marks the instance as modified in the udRenderInstanceLists containing it. Must be called after modifying matrix in
+    place
+    """
+    for renderList in self._renderLists:
+      renderList._mark_dirty(self)
+    if self._transformOwner is not None:
+      self._transformOwner._mark_dirty(self)
+
+  def _refresh(self):
+    """
+    brings the matrix and transformation of the instance up to date with the udRenderInstanceArray holding them
+    """
+    if self._transformOwner is not None:
+      self._transformOwner._refresh(self)
+
+  @classmethod
+  def array_of(cls, instances):
+    """
+    returns a ctypes array of copies of the udRenderInstances instances, as passed to udRenderContext_Render
+    """
+    for instance in instances:
+      instance._refresh()
+    return (cls * len(instances))(*instances)
+
   @property
   def scaleMode(self):
     """
@@ -641,17 +915,21 @@ define the properties of the models to be rendered
   @property
   def position(self):
     """The position of the instance in world space"""
+    self._refresh()
     return tuple(self.matrix[12:15])
 
   @position.setter
   def position(self, position):
+    self._refresh()
     self.matrix[12:15] = position
+    self._changed()
 
   @property
   def scale(self):
     """
     The scale of the renderInstance
     """
+    self._refresh()
     try:
       return self.__scale
     except AttributeError:
@@ -671,6 +949,7 @@ define the properties of the models to be rendered
     """
     x-y-z rotation of the instance
     """
+    self._refresh()
     return self.__rotation
 
   @rotation.setter
@@ -684,6 +963,7 @@ define the properties of the models to be rendered
     Skew of the instance. Note that a non zero value will likely cause rendering artifacts as UD is not designed to deal
     with this.
     """
+    self._refresh()
     try:
       return self.__skew
     except AttributeError:
@@ -708,6 +988,7 @@ define the properties of the models to be rendered
     sets the rotation and scaling elements of the renderInstance
     We are setting the parameters of the 4x4 homogeneous transformation matrix
     """
+    self._refresh()
     self.__rotation = tuple(rotation)
     self.__scale = tuple(scale)
     self.__skew = tuple(skew)
@@ -751,6 +1032,16 @@ define the properties of the models to be rendered
     self._voxelShader = fcn
     self.pVoxelShader = VOXELSHADERTYPE(self._voxelShader)
 
+  def set_attribute_shader(self, shader, attributeName: str, lut=None):
+    """
+    Sets the voxel shader of this instance to shader(read, pVoxelID, lut) run by a udVoxelShaderRuntime bound to the
+    model of the instance, returns the runtime. See udVoxelShaderRuntime
+    """
+    runtime = udVoxelShaderRuntime(shader, attributeName, lut)
+    runtime.bind(self.model)
+    self.voxelShader = runtime
+    return runtime
+
   @property
   def voxelShaderData(self):
     """
@@ -780,6 +1071,352 @@ define the properties of the models to be rendered
     # do this last as it ensures that the previous object is not GCd until after the pointer has changed:
     self._geometryFilter = value
 
+  def _store_transformation(self, rotation, scale, skew):
+    """
+    records the rotation, scale and skew of a matrix written to the instance by a udRenderInstanceArray
+    """
+    self.__rotation = tuple(rotation)
+    self.__scale = tuple(scale)
+    self.__skew = tuple(skew)
+
+
+def _rotation_matrices(rotation):
+  """
+  returns the (N, 3, 3) rotation matrices of the (N, 3) x-y-z rotations, as constructed by
+  udRenderInstance.update_transformation
+  """
+  sp, sr, sy = np.sin(rotation).T
+  cp, cr, cy = np.cos(rotation).T
+  ret = np.empty((len(rotation), 3, 3))
+  ret[:, 0, 0] = cy * cp
+  ret[:, 0, 1] = cy * sp * sr - sy * cr
+  ret[:, 0, 2] = cy * sp * cr + sy * sr
+  ret[:, 1, 0] = sy * cp
+  ret[:, 1, 1] = sy * sp * sr + cy * cr
+  ret[:, 1, 2] = sy * sp * cr - cy * sr
+  ret[:, 2, 0] = -sp
+  ret[:, 2, 1] = cp * sr
+  ret[:, 2, 2] = cp * cr
+  return ret
+
+
+class udRenderInstanceArray:
+  """
+  Manages the transformations of many udRenderInstances as a struct of arrays.
+  The position, rotation, scale, skew and pivot of each instance are rows of (N, 3) numpy arrays which may be modified
+  directly; update then computes the matrices of all (or selected) instances in one vectorised pass and writes them
+  straight into array, a persistent ctypes array of the instances which can be passed to udRenderContext.render.
+  matrices is an (N, 4, 4) view of the matrices within array.
+  Matrices are the scale, skew and rotation of udRenderInstance.update_transformation applied about the pivot, followed
+  by the translation position. This intentionally differs from update_transformation for a nonzero pivot: that takes
+  the translation of the current matrix, which already includes the pivot offset, as its position, so each update made
+  through the properties of an instance moves it. position here is the translation before the pivot offset, so it is
+  not udRenderInstance.position unless the pivot is zero, and repeated updates do not move the instance.
+  The array holds the transformations of its instances until release is called: changes made to the instances through
+  their properties are recorded so reload_changed can read just those instances, and the instances are only brought up
+  to date with the array when their transformation properties are next used, or by write_back. An instance can be held
+  by one udRenderInstanceArray at a time.
+  """
+  def __init__(self, instances):
+    """
+    copies the udRenderInstances instances into array, taking their current transformations
+    """
+    # the instances are kept to hold references to their models, filters and shaders:
+    self.instances = list(instances)
+    for instance in self.instances:
+      if instance._transformOwner not in (None, self):
+        raise ValueError("Instance is held by another udRenderInstanceArray, release it first")
+    count = len(self.instances)
+    self.array = (udRenderInstance * count)(*self.instances)
+    if count:
+      self.matrices = np.ndarray((count, 4, 4), dtype=np.float64, buffer=self.array,
+                                 offset=udRenderInstance.matrix.offset,
+                                 strides=(ctypes.sizeof(udRenderInstance), 4 * 8, 8))
+    else:
+      self.matrices = np.zeros((0, 4, 4))
+    self.rotation = np.zeros((count, 3))
+    self.scale = np.ones((count, 3))
+    self.skew = np.zeros((count, 3))
+    self.pivot = np.zeros((count, 3))
+    self.position = np.zeros((count, 3))
+    self._indices = {}  # id(instance) -> indices of the instance in the array
+    for i, instance in enumerate(self.instances):
+      self._indices.setdefault(id(instance), []).append(i)
+    self._stale = np.zeros(count, dtype=bool)  # instances whose objects are behind the array
+    self._changedIndices = set()  # instances changed through their objects since they were last read
+    self._lock = threading.Lock()
+    self._listSlots = None  # (renderList, version, indices, slots) of the last write_back to a udRenderInstanceList
+    self.reload()
+    for instance in self.instances:
+      instance._transformOwner = self
+
+  def _mark_dirty(self, instance):
+    with self._lock:
+      self._changedIndices.update(self._indices.get(id(instance), ()))
+
+  def _refresh(self, instance):
+    for i in self._indices.get(id(instance), ()):
+      if self._stale[i]:
+        self._stale[i] = False
+        ctypes.memmove(instance.matrix, ctypes.byref(self.array, i * ctypes.sizeof(udRenderInstance) +
+                                                     udRenderInstance.matrix.offset), ctypes.sizeof(instance.matrix))
+        instance._store_transformation(self.rotation[i].tolist(), self.scale[i].tolist(), self.skew[i].tolist())
+
+  def reload(self, indices=None):
+    """
+    Reads the current transformations of the udRenderInstance objects at indices, by default all instances, replacing
+    those held by the array
+    """
+    indices = np.atleast_1d(np.arange(len(self))[indices if indices is not None else slice(None)])
+    instances = [self.instances[i] for i in indices]
+    self.rotation[indices] = np.array([instance.rotation for instance in instances], dtype=float).reshape(-1, 3)
+    self.scale[indices] = np.array([instance.scale for instance in instances], dtype=float).reshape(-1, 3)
+    self.skew[indices] = np.array([instance.skew for instance in instances], dtype=float).reshape(-1, 3)
+    self.pivot[indices] = np.array([instance.pivot for instance in instances], dtype=float).reshape(-1, 3)
+    self.matrices[indices] = np.array([instance.matrix[:] for instance in instances], dtype=float).reshape(-1, 4, 4)
+    # the position reproducing the current matrix of each instance:
+    pivot = self.pivot[indices]
+    self.position[indices] = self.matrices[indices, 3, :3] + np.einsum("ni,nij->nj", pivot, self._linear(indices)) - \
+                             (1 - np.einsum("ni,ni->n", pivot, self.skew[indices]))[:, None] * pivot
+    self._stale[indices] = False
+
+  def reload_changed(self):
+    """
+    Reloads only the instances whose udRenderInstance objects have been transformed since they were last read, so those
+    changes are not overwritten by the next update. Returns the number of instances reloaded
+    """
+    with self._lock:
+      changed, self._changedIndices = self._changedIndices, set()
+    if changed:
+      self.reload(sorted(changed))
+    return len(changed)
+
+  def __len__(self):
+    return len(self.instances)
+
+  def _linear(self, indices):
+    """
+    returns the (N, 3, 3) scaled rotations of the instances at indices
+    """
+    return self.scale[indices][:, :, None] * _rotation_matrices(self.rotation[indices])
+
+  def update(self, indices=None):
+    """
+    Recomputes the matrices of the instances at indices, by default all instances, from position, rotation, scale, skew
+    and pivot.
+    The matrix is the scale, skew, rotation and translation of the instance applied about its pivot
+    """
+    if indices is None:
+      indices = slice(None)
+    pivot = self.pivot[indices]
+    skew = self.skew[indices]
+    linear = self._linear(indices)
+    # equivalent to piv . [[linear, skew], [position, 1]] . inv(piv) for the translation by -pivot piv:
+    w = 1 - np.einsum("ni,ni->n", pivot, skew)
+    matrices = np.empty((len(linear), 4, 4))
+    matrices[:, :3, :3] = linear + skew[:, :, None] * pivot[:, None, :]
+    matrices[:, :3, 3] = skew
+    matrices[:, 3, :3] = self.position[indices] - np.einsum("ni,nij->nj", pivot, linear) + w[:, None] * pivot
+    matrices[:, 3, 3] = w
+    self.matrices[indices] = matrices
+    self._stale[indices] = True
+
+  def rotate(self, angles, indices=None):
+    """
+    adds angles, an x-y-z rotation or (N, 3) array of rotations, to the rotation of the instances at indices and updates
+    their matrices
+    """
+    if indices is None:
+      indices = slice(None)
+    self.rotation[indices] = np.mod(self.rotation[indices] + angles, 2 * np.pi)
+    self.update(indices)
+
+  def translate(self, offsets, indices=None):
+    """
+    adds offsets, a vector or (N, 3) array of vectors, to the position of the instances at indices and updates their
+    matrices
+    """
+    if indices is None:
+      indices = slice(None)
+    self.position[indices] += offsets
+    self.update(indices)
+
+  def write_back(self, indices=None, renderList=None):
+    """
+    Copies the matrices of the instances at indices, by default all instances, to where they are rendered from.
+    With renderList, a udRenderInstanceList containing the instances, the matrices are written into its native array in
+    one pass, leaving the udRenderInstance objects to be brought up to date when next used. Otherwise the matrices and
+    transformations are copied to the udRenderInstance objects, which is only needed where those objects, rather than
+    array, are rendered
+    """
+    if renderList is not None:
+      renderList.sync()
+      if self._listSlots is None or self._listSlots[0] is not renderList or self._listSlots[1] != renderList._version:
+        pairs = [(i, slot) for i, instance in enumerate(self.instances) for slot in renderList._slots.get(id(instance), ())]
+        sources, slots = np.array(pairs, dtype=np.int64).reshape(-1, 2).T
+        self._listSlots = (renderList, renderList._version, sources, slots)
+      sources, slots = self._listSlots[2:]
+      if indices is not None:
+        keep = np.isin(sources, np.arange(len(self))[indices])
+        sources, slots = sources[keep], slots[keep]
+      renderList.matrices[slots] = self.matrices[sources]
+      return
+    indices = np.atleast_1d(np.arange(len(self))[indices if indices is not None else slice(None)])
+    for i in indices:
+      instance = self.instances[i]
+      self._stale[i] = True
+      self._refresh(instance)
+      for renderList in instance._renderLists:
+        renderList._mark_dirty(instance)
+
+  def release(self):
+    """
+    brings the udRenderInstance objects up to date with the array and stops holding their transformations, so they may
+    be transformed directly or added to another udRenderInstanceArray
+    """
+    for instance in self.instances:
+      if instance._transformOwner is self:
+        self._refresh(instance)
+        instance._transformOwner = None
+
+
+class udRenderInstanceList:
+  """
+  List of udRenderInstances kept in a persistent native array for rendering.
+  Instead of converting a python list of instances to a ctypes array on every render, the instances are copied into
+  slots of a preallocated array when added, and afterwards only instances whose matrix, opacity, filter, shader or
+  other native fields have changed since the last render are copied again. Changes made through the attributes and
+  properties of udRenderInstance are tracked automatically; after modifying an instance's matrix in place call its
+  _changed method or mark_dirty.
+  Can be passed to udRenderContext.render in place of a list.
+  """
+  def __init__(self, instances=(), capacity=16):
+    self._instances = []
+    self._slots = {}  # id(instance) -> slot indices of the instance
+    self._dirty = {}  # id(instance) -> instance for instances changed since the last sync
+    self._lock = threading.Lock()
+    self._array = (udRenderInstance * max(1, capacity))()
+    self._view = None
+    self._version = 0  # incremented whenever instances are added or removed
+    for instance in instances:
+      self.append(instance)
+
+  def __len__(self):
+    return len(self._instances)
+
+  def __getitem__(self, index):
+    return self._instances[index]
+
+  def __iter__(self):
+    return iter(self._instances)
+
+  def __contains__(self, instance):
+    return id(instance) in self._slots
+
+  def index(self, instance):
+    return self._instances.index(instance)
+
+  @property
+  def capacity(self):
+    """
+    the number of instances the native array can hold before it must be reallocated
+    """
+    return len(self._array)
+
+  def _copy_to_slot(self, instance, slot):
+    instance._refresh()
+    ctypes.memmove(ctypes.byref(self._array, slot * ctypes.sizeof(udRenderInstance)), ctypes.byref(instance),
+                   ctypes.sizeof(udRenderInstance))
+
+  def _reindex(self):
+    self._slots = {}
+    for i, instance in enumerate(self._instances):
+      self._slots.setdefault(id(instance), []).append(i)
+
+  def append(self, instance: udRenderInstance):
+    """
+    adds instance to the end of the list, growing the native array if it is full
+    """
+    count = len(self._instances)
+    if count == len(self._array):
+      array = (udRenderInstance * (2 * count))()
+      ctypes.memmove(array, self._array, ctypes.sizeof(self._array))
+      self._array = array
+    self._instances.append(instance)
+    self._slots.setdefault(id(instance), []).append(count)
+    if self not in instance._renderLists:
+      instance._renderLists = (*instance._renderLists, self)
+    self._copy_to_slot(instance, count)
+    self._view = None
+    self._version += 1
+
+  def extend(self, instances):
+    for instance in instances:
+      self.append(instance)
+
+  def pop(self, index=-1):
+    """
+    removes and returns the instance at index, moving the instances after it down a slot
+    """
+    instance = self._instances.pop(index)
+    index = index % (len(self._instances) + 1)
+    size = ctypes.sizeof(udRenderInstance)
+    tail = len(self._instances) - index
+    if tail:
+      ctypes.memmove(ctypes.byref(self._array, index * size), ctypes.byref(self._array, (index + 1) * size), tail * size)
+    self._reindex()
+    if id(instance) not in self._slots:
+      instance._renderLists = tuple(l for l in instance._renderLists if l is not self)
+      self._dirty.pop(id(instance), None)
+    self._view = None
+    self._version += 1
+    return instance
+
+  def remove(self, instance: udRenderInstance):
+    self.pop(self.index(instance))
+
+  def clear(self):
+    while self._instances:
+      self.pop()
+
+  def _mark_dirty(self, instance):
+    with self._lock:
+      self._dirty[id(instance)] = instance
+
+  def mark_dirty(self, instance: udRenderInstance = None):
+    """
+    marks instance, or every instance if None, to be copied to the native array before the next render
+    """
+    for instance in (self._instances if instance is None else [instance]):
+      self._mark_dirty(instance)
+
+  def sync(self):
+    """
+    Copies the instances modified since the last sync to their slots in the native array.
+    Returns a ctypes array of the instances viewing the native array, as passed to udRenderContext_Render
+    """
+    with self._lock:
+      dirty, self._dirty = self._dirty, {}
+      for key, instance in dirty.items():
+        for slot in self._slots.get(key, ()):
+          self._copy_to_slot(instance, slot)
+      if self._view is None:
+        self._view = (udRenderInstance * len(self._instances)).from_buffer(self._array)
+      return self._view
+
+  @property
+  def matrices(self):
+    """
+    (N, 4, 4) numpy view of the matrices of the instances in the native array, brought up to date by sync. Writing to it
+    changes what is rendered but not the udRenderInstance objects
+    """
+    view = self.sync()
+    if not len(view):
+      return np.zeros((0, 4, 4))
+    return np.ndarray((len(view), 4, 4), dtype=np.float64, buffer=view, offset=udRenderInstance.matrix.offset,
+                      strides=(ctypes.sizeof(udRenderInstance), 4 * 8, 8))
+
+
 class udContext:
   """
   Class managing the login status of udSDK. Required to be instantiated and connected to a server
@@ -928,6 +1565,45 @@ class udContext:
     self.isConnected = True
 
 
+udRenderConvergence = namedtuple("udRenderConvergence", ["passes", "elapsed", "converged"])
+udPickResult = namedtuple("udPickResult", ["positions", "hit", "modelIndex"])
+
+
+def _containing_instance(renderInstances, positions):
+  """
+  returns the (N,) index of the only one of renderInstances whose model bounds contain each of positions, or -1 if none
+  or several do. Instances without models, such as the elements of a ctypes array, contain no positions
+  """
+  if isinstance(renderInstances, udRenderInstanceArray):
+    instances = renderInstances.instances
+    matrices = np.array(renderInstances.matrices)
+  elif isinstance(renderInstances, udRenderInstanceList):
+    instances = list(renderInstances)
+    matrices = np.array(renderInstances.matrices)
+  else:
+    instances = list(renderInstances)
+    for instance in instances:
+      instance._refresh()
+    matrices = np.array([instance.matrix[:] for instance in instances], dtype=float).reshape(-1, 4, 4)
+  ret = np.full(len(positions), -1, dtype=np.int64)
+  models = [getattr(instance, "model", None) for instance in instances]
+  candidates = [i for i, model in enumerate(models) if model is not None]
+  if not candidates or not len(positions):
+    return ret
+  centres = np.array([models[i].header.boundingBoxCenter[:] for i in candidates])
+  extents = np.array([models[i].header.boundingBoxExtents[:] for i in candidates])
+  # the positions in the model space of each instance:
+  homogeneous = np.concatenate([positions, np.ones((len(positions), 1))], axis=1)
+  local = np.einsum("nj,mjk->mnk", homogeneous, np.linalg.inv(matrices[candidates]))
+  with np.errstate(invalid="ignore"):
+    local = local[..., :3] / local[..., 3:]
+    tolerance = 1e-6 * (1 + extents[:, None, :])
+    inside = np.all(np.abs(local - centres[:, None, :]) <= extents[:, None, :] + tolerance, axis=2)
+  single = np.count_nonzero(inside, axis=0) == 1
+  ret[single] = np.asarray(candidates)[np.argmax(inside[:, single], axis=0)]
+  return ret
+
+
 class udRenderContext:
   """
   Manages render state. Ideally only one of these should exist at a time
@@ -951,22 +1627,220 @@ class udRenderContext:
 
   def render(self, renderTarget, renderInstances, renderSettings=None):
     """
-    Performs a render of the list of udRenderInstances to renderTarget.
+    Performs a render of the list of udRenderInstances to renderTarget. renderInstances is a list, ctypes array,
+    udRenderInstanceList or udRenderInstanceArray; the latter two avoid converting the instances to a ctypes array every
+    frame.
     If renderSettings are None then the settings are taken from those contained in the renderTarget object.
     """
     if renderSettings is None:
       renderSettings = renderTarget.renderSettings
 
-    if isinstance(renderInstances, list):
-      renderInstances = (udRenderInstance * len(renderInstances))(*renderInstances)
+    if isinstance(renderInstances, udRenderInstanceList):
+      renderInstances = renderInstances.sync()
+    elif isinstance(renderInstances, udRenderInstanceArray):
+      renderInstances = renderInstances.array
+    elif isinstance(renderInstances, list):
+      renderInstances = udRenderInstance.array_of(renderInstances)
     _HandleReturnValue(
       self.udRenderContext_Render(self.renderer, renderTarget.pRenderView, renderInstances, len(renderInstances),
                                   renderSettings))
 
+  def render_until_converged(self, renderTarget, renderInstances, renderSettings=None, timeBudget=10.0, minPasses=1,
+                             maxPasses=None, patience=2, streamer=None):
+    """
+    Renders renderInstances to renderTarget repeatedly until streaming has finished refining the view.
+    After each pass the streamer is updated; rendering stops once it has no active requests, or once the time it spent
+    starved of data has not improved for patience consecutive passes. Rendering also stops after maxPasses passes or
+    once timeBudget seconds have elapsed, the view is then rendered as far as it was refined.
+    streamer is the udStreamer to poll, by default a new one is created.
+    Returns udRenderConvergence(passes, elapsed, converged): the number of passes rendered, the time taken in seconds and
+    whether streaming finished within the limits
+    """
+    if isinstance(renderInstances, list):
+      renderInstances = udRenderInstance.array_of(renderInstances)
+    if streamer is None:
+      streamer = udStreamer()
+    start = time.perf_counter()
+    passes = 0
+    bestStarvedTime = None
+    stalledPasses = 0
+    converged = False
+    while True:
+      self.render(renderTarget, renderInstances, renderSettings)
+      passes += 1
+      streamer.update()
+      elapsed = time.perf_counter() - start
+      if passes >= minPasses:
+        if not streamer.active:
+          converged = True
+          break
+        if bestStarvedTime is None or streamer.starvedTimeMsSinceLastUpdate < bestStarvedTime:
+          bestStarvedTime = streamer.starvedTimeMsSinceLastUpdate
+          stalledPasses = 0
+        else:
+          stalledPasses += 1
+          if stalledPasses >= patience:
+            converged = True
+            break
+      if elapsed >= timeBudget or (maxPasses is not None and passes >= maxPasses):
+        break
+    logger.debug(f"render {'converged' if converged else 'stopped'} after {passes} passes in {elapsed:.3f}s")
+    return udRenderConvergence(passes, elapsed, converged)
+
+  def pick_many(self, renderTarget, renderInstances, pixels, renderSettings=None, exact=False, render=True):
+    """
+    Picks many pixels of a render of renderInstances to renderTarget at once.
+    pixels is an (N, 2) array of (x, y) pixel coordinates. The view is rendered once, unless render is False in which
+    case the depth buffer of the last render is used, and every pixel is answered from the unprojection of the depth
+    buffer (see udRenderTarget.unproject_depth). The model index of a hit is that of the only instance whose bounds
+    contain the position, or -1 where this is ambiguous.
+    exact is a boolean, or an (N,) boolean array selecting pixels, for which the view is re-rendered with the pick of
+    renderSettings set to the pixel so the exact voxel position and model index are returned by the renderer. Each
+    exact pixel hit by the render costs a render of its own.
+    Returns udPickResult(positions, hit, modelIndex): an (N, 3) array of world positions (nan where nothing was hit),
+    an (N,) boolean array of hits and an (N,) integer array of the indices of the instances hit
+    """
+    if renderSettings is None:
+      renderSettings = renderTarget.renderSettings
+    pixels = np.asarray(pixels, dtype=np.int64).reshape(-1, 2)
+    x, y = pixels[:, 0], pixels[:, 1]
+    if np.any((x < 0) | (x >= renderTarget.width) | (y < 0) | (y >= renderTarget.height)):
+      raise ValueError("pixels must lie within the render target")
+    instances = renderInstances
+    if isinstance(renderInstances, list):
+      # converted once for the exact picks:
+      renderInstances = udRenderInstance.array_of(renderInstances)
+    if render:
+      self.render(renderTarget, renderInstances, renderSettings)
+
+    depth = renderTarget.depth_array()[y, x]
+    positions, hit = _unproject_pixels(x, y, depth, renderTarget.width, renderTarget.height, renderTarget.viewMatrix,
+                                       renderTarget.projectionMatrix, renderTarget.logarithmicDepthPlanes)
+    modelIndex = _containing_instance(instances, positions)
+    modelIndex[~hit] = -1
+
+    exact = np.broadcast_to(np.asarray(exact, dtype=bool), hit.shape) & hit
+    if np.any(exact):
+      settings = renderSettings.copy()
+      # each distinct pixel is only rendered once:
+      picked, inverse = np.unique(pixels[exact], axis=0, return_inverse=True)
+      results = []
+      for pickX, pickY in picked.tolist():
+        settings.set_pick(pickX, pickY)
+        self.render(renderTarget, renderInstances, settings)
+        pick = settings.pick
+        results.append((bool(pick.hit), pick.modelIndex, [*pick.pointCentre]))
+      for i, j in zip(np.flatnonzero(exact), np.ravel(inverse)):
+        pickHit, pickModelIndex, pickPosition = results[j]
+        hit[i] = pickHit
+        modelIndex[i] = pickModelIndex if pickHit else -1
+        positions[i] = pickPosition if pickHit else np.nan
+    return udPickResult(positions, hit, modelIndex)
+
   def __del__(self):
     self._destroy()
 
 
+def _colour_array(colourBuffer, width, height, channelOrder="BGRA", out=None):
+  """
+  returns the 32 bit ARGB colourBuffer of a render as a (height, width, channels) uint8 array in channelOrder
+  """
+  if colourBuffer is None:
+    raise Exception("No Colour Buffer")
+  pixels = np.frombuffer(colourBuffer, dtype=np.uint8).reshape(height, width, 4)
+  if channelOrder == "BGRA":
+    # the byte order of little endian ARGB values in memory
+    view = pixels
+  elif channelOrder == "BGR":
+    view = pixels[..., :3]
+  elif channelOrder == "RGB":
+    view = pixels[..., 2::-1]
+  elif channelOrder == "RGBA":
+    if out is None:
+      out = np.empty((height, width, 4), dtype=np.uint8)
+    colours = np.frombuffer(colourBuffer, dtype=np.uint32).reshape(height, width)
+    swapped = out.view(np.uint32).reshape(height, width)
+    np.bitwise_and(colours, 0xFF00FF00, out=swapped)
+    swapped |= (colours >> 16) & 0xFF
+    swapped |= (colours & 0xFF) << 16
+    return out
+  else:
+    raise ValueError(f"Unsupported channel order {channelOrder}")
+  if out is not None:
+    out[...] = view
+    return out
+  return view
+
+
+def _depth_array(depthBuffer, width, height, out=None):
+  """
+  returns the depthBuffer of a render as a (height, width) float32 array
+  """
+  if depthBuffer is None:
+    raise ValueError("No Depth Buffer")
+  view = np.frombuffer(depthBuffer, dtype=np.float32).reshape(height, width)
+  if out is not None:
+    out[...] = view
+    return out
+  return view
+
+
+def _unproject_pixels(x, y, depth, width, height, viewMatrix, projectionMatrix, logarithmicDepthPlanes=None):
+  """
+  Returns the (N, 3) world space positions of pixels (x, y) of a render of width x height with the depth buffer values
+  depth, and an (N,) boolean array of which pixels were written by the render (depth < 1).
+  Projective (perspective and orthographic) depth is the window depth d of ndcZ = 2d - 1, unprojected through the
+  inverse of the view projection. Logarithmic depth, rendered with the (near, far) logarithmicDepthPlanes, is the view
+  depth w = (far + 1)^d - 1, located along the ray of the pixel between its unprojections on the near and far planes of
+  the projection. The view depth of these is their homogeneous w for perspective projections and, for orthographic
+  (affine) projections, is solved from the z column of the projection (ndcZ = a . view + b)
+  """
+  x = np.asarray(x, dtype=float).ravel()
+  y = np.asarray(y, dtype=float).ravel()
+  depth = np.asarray(depth, dtype=float).ravel()
+  valid = depth < 1
+  projectionMatrix = np.reshape(projectionMatrix, (4, 4))
+  inverse = np.linalg.inv(np.reshape(viewMatrix, (4, 4)) @ projectionMatrix)
+  ndc = np.empty((len(depth), 4))
+  # pixel centres, with row 0 at the top of the render:
+  ndc[:, 0] = (x + 0.5) / width * 2 - 1
+  ndc[:, 1] = 1 - (y + 0.5) / height * 2
+  ndc[:, 3] = 1
+  with np.errstate(divide="ignore", invalid="ignore"):
+    if logarithmicDepthPlanes is None:
+      ndc[:, 2] = 2 * depth - 1
+      homogeneous = ndc @ inverse
+      points = homogeneous[:, :3] / homogeneous[:, 3:]
+    else:
+      nearPlane, farPlane = logarithmicDepthPlanes
+      ndc[:, 2] = -1
+      near = ndc @ inverse
+      ndc[:, 2] = 1
+      far = ndc @ inverse
+      if np.allclose(projectionMatrix[:, 3], [0, 0, 0, 1]):
+        # affine (orthographic) projection: w is 1 everywhere, the view depth along the z axis of the projection of
+        # ndcZ = a . view + b is (ndcZ - b) / |a|
+        a = np.linalg.norm(projectionMatrix[:3, 2])
+        if a == 0:
+          raise ValueError("Projection matrix has no depth to unproject")
+        b = projectionMatrix[3, 2]
+        nearDepth = np.full(len(depth), (-1 - b) / a)
+        farDepth = np.full(len(depth), (1 - b) / a)
+        near = near[:, :3] / near[:, 3:]
+        far = far[:, :3] / far[:, 3:]
+      else:
+        # the view depth of the unprojected points is the reciprocal of their homogeneous coordinate:
+        nearDepth = 1 / near[:, 3]
+        farDepth = 1 / far[:, 3]
+        near = near[:, :3] * nearDepth[:, None]
+        far = far[:, :3] * farDepth[:, None]
+      viewDepth = np.power(farPlane + 1, depth) - 1
+      t = (viewDepth - nearDepth) / (farDepth - nearDepth)
+      points = near + t[:, None] * (far - near)
+  points[~valid] = np.nan
+  return points, valid
+
+
 class udRenderTarget:
   """
   Class controlling the view to be rendered
@@ -986,6 +1860,8 @@ class udRenderTarget:
     self.pRenderView = ctypes.c_void_p(0)
     self.renderSettings = udRenderSettings()
     self.filter = None
+    # the (near, far) planes if the target renders logarithmic depth:
+    self.logarithmicDepthPlanes = None
 
     self._width = width
     self._height = height
@@ -1075,10 +1951,23 @@ class udRenderTarget:
 
   def rgb_colour_buffer(self):
     """returns the colour buffer as a width x height long list of (r,g,b) tuples in the range of 0-255 per channel """
-    out = []
-    for colour in self.colourBuffer:
-      out.append((colour >> 16 & 0xFF, colour >> 8 & 0xFF, colour & 0xFF))
-    return out
+    return list(map(tuple, self.colour_array("RGB").reshape(-1, 3).tolist()))
+
+  def colour_array(self, channelOrder="BGRA", out=None):
+    """
+    returns the colour buffer as a (height, width, channels) uint8 numpy array.
+    channelOrder is one of "BGRA", "BGR", "RGB" or "RGBA". "BGRA" is the order of the bytes in the buffer, it and "BGR"
+    and "RGB" are views of the buffer without copying, they are overwritten by the next render. "RGBA" is swizzled into a
+    new array. If out is given the result is written into it instead
+    """
+    return _colour_array(self.colourBuffer, self._width, self._height, channelOrder, out)
+
+  def depth_array(self, out=None):
+    """
+    returns the depth buffer as a (height, width) float32 numpy array viewing the buffer without copying, or copied into
+    out if given
+    """
+    return _depth_array(self.depthBuffer, self._width, self._height, out)
 
   def _create(self, context, udRenderer, width, height):
     self.context = context
@@ -1162,6 +2051,26 @@ class udRenderTarget:
     Switches the render target to use logarithmic depth and sets the near and far planes
     """
     self._udRenderTarget_SetLogarithmicDepthPlanes(self.pRenderView, ctypes.c_double(nearPlane), ctypes.c_double(farPlane))
+    self.logarithmicDepthPlanes = (nearPlane, farPlane)
+
+  def unproject_depth(self, stride=1, depth=None):
+    """
+    Converts the depth buffer of the last render to world space positions using the current view and projection
+    matrices, for perspective, orthographic or logarithmic (see set_logarithmic_depth_planes) depth.
+    stride subsamples the buffer, taking every stride-th pixel of every stride-th row. depth is the (height, width)
+    depth buffer to use in place of the target's, such as the depth_array of a udRenderBuffer.
+    Returns (points, valid): a (rows, columns, 3) float64 array of positions and a (rows, columns) boolean array of
+    which pixels contain geometry; the positions of the other pixels are nan. points[valid] is the visible surface as
+    an (N, 3) point cloud
+    """
+    if depth is None:
+      depth = self.depth_array()
+    depth = np.asarray(depth)[::stride, ::stride]
+    rows, columns = depth.shape
+    y, x = np.mgrid[0:self._height:stride, 0:self._width:stride]
+    points, valid = _unproject_pixels(x, y, depth, self._width, self._height, self.viewMatrix, self.projectionMatrix,
+                                      self.logarithmicDepthPlanes)
+    return points.reshape(rows, columns, 3), valid.reshape(rows, columns)
 
   def __del__(self):
     self._destroy()
@@ -1171,6 +2080,7 @@ class udPointCloud:
   """
   UDS format point cloud
   """
+  _probePool = None  # udPointBufferPool of the single point buffers of probe queries
 
   def __init__(self, path: str = None, context: udContext = None):
     self.udPointCloud_Load = getattr(udSDKlib, "udPointCloud_Load")
@@ -1186,7 +2096,10 @@ class udPointCloud:
     self.header = udPointCloudHeader()
     self.manuallyLoaded = False
 
-    self.load(context, path)
+    self.path = path
+    self.context = context
+    if path is not None:
+      self.load(context, path)
     self.uri = path
 
   def load(self, context: udContext, modelLocation: str):
@@ -1194,7 +2107,9 @@ class udPointCloud:
     Loads the model located at modelLocation
     """
     self.path = modelLocation
+    self.context = context
     self.manuallyLoaded = False
+    self._attributeLayout = None
     if(self.pPointCloud != ctypes.c_void_p(0)):
       self._unload()
 
@@ -1212,6 +2127,7 @@ class udPointCloud:
     ret = udPointCloud()
     ret.pPointCloud = pPointCloud
     ret.header = ret.get_header()
+    ret._attributeLayout = None
     ret.manuallyLoaded = True
     return ret
 
@@ -1275,31 +2191,404 @@ class udPointCloud:
     Retrieves the value of an attribute with the name attrName from the specified voxel
     """
     pVoxelID = ctypes.c_void_p(pVoxelID)
-    offset = self.header.attributes.get_offset(attrName)
-    typeInfo = udAttributeTypeInfo(self.header.attributes[attrName].typeInfo)
+    attribute = self.attributeLayout[attrName]
     pAttributeValue = ctypes.c_void_p(0)
     _HandleReturnValue(
-      self.udPointCloud_GetAttributeAddress(self.pPointCloud, pVoxelID, ctypes.c_uint32(offset),
+      self.udPointCloud_GetAttributeAddress(self.pPointCloud, pVoxelID, ctypes.c_uint32(attribute.offset),
                                             ctypes.byref(pAttributeValue)))
-    return ctypes.cast(pAttributeValue, ctypes.POINTER(typeInfo.to_ctype())).contents.value
+    return ctypes.cast(pAttributeValue, ctypes.POINTER(attribute.ctype)).contents.value
+
+  def _attribute_address_function(self):
+    """
+    returns udPointCloud_GetAttributeAddress with its argument types declared so that raw addresses can be passed
+    without wrapping each in a ctypes object
+    """
+    if getattr(self, "_getAttributeAddress", None) is None:
+      # indexing the library returns a function object separate from the shared attribute, so declaring the argument
+      # types here does not affect other callers
+      function = udSDKlib["udPointCloud_GetAttributeAddress"]
+      function.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(ctypes.c_void_p)]
+      self._getAttributeAddress = function
+    return self._getAttributeAddress
+
+  @staticmethod
+  def _voxel_addresses(voxelIDs):
+    """
+    returns the list of addresses of the voxels in voxelIDs, which may be a ctypes or numpy array of udVoxelID, an
+    array of addresses or a sequence of udVoxelID, pointers to udVoxelID or addresses
+    """
+    if isinstance(voxelIDs, ctypes.Array) and issubclass(voxelIDs._type_, udVoxelID):
+      return (ctypes.addressof(voxelIDs) + np.arange(len(voxelIDs), dtype=np.uint64) * ctypes.sizeof(udVoxelID)).tolist()
+    if isinstance(voxelIDs, np.ndarray):
+      if voxelIDs.dtype.names:
+        return (voxelIDs.ctypes.data + np.arange(len(voxelIDs), dtype=np.uint64) * voxelIDs.strides[0]).tolist()
+      return voxelIDs.astype(np.uint64).tolist()
+    ret = []
+    for voxelID in voxelIDs:
+      if isinstance(voxelID, udVoxelID):
+        ret.append(ctypes.addressof(voxelID))
+      elif isinstance(voxelID, (ctypes._Pointer, ctypes.c_void_p)):
+        ret.append(ctypes.cast(voxelID, ctypes.c_void_p).value)
+      else:
+        ret.append(int(voxelID))
+    return ret
+
+  def get_attributes(self, voxelIDs, attributeNames=None):
+    """
+    Retrieves the values of attributes for many voxels at once.
+    voxelIDs may be a ctypes or numpy array of udVoxelID, an array of voxel addresses, or a sequence of udVoxelID,
+    pointers to them or addresses. attributeNames is a list of attribute names, defaulting to all attributes of the
+    point cloud, or a single name.
+    Returns a dictionary mapping each name to a numpy array of the attribute for each voxel, or the array alone if a
+    single name was passed
+    """
+    single = isinstance(attributeNames, str)
+    if attributeNames is None:
+      attributeNames = self.attributeLayout.names
+    elif single:
+      attributeNames = [attributeNames]
+    attributes = [self.attributeLayout[name] for name in attributeNames]
+
+    addresses = self._voxel_addresses(voxelIDs)
+    getAddress = self._attribute_address_function()
+    pPointCloud = self.pPointCloud.value
+    memmove = ctypes.memmove
+    pAttributeValue = ctypes.c_void_p(0)
+    ppAttributeValue = ctypes.byref(pAttributeValue)
+    ret = {}
+    for attribute in attributes:
+      values = np.zeros(len(addresses), attribute.dtype)
+      size = attribute.dtype.itemsize
+      offset = attribute.offset
+      pOut = values.ctypes.data
+      for pVoxelID in addresses:
+        error = getAddress(pPointCloud, pVoxelID, offset, ppAttributeValue)
+        if error:
+          _HandleReturnValue(error)
+        memmove(pOut, pAttributeValue.value, size)
+        pOut += size
+      ret[attribute.name] = values
+    if single:
+      return ret[attributes[0].name]
+    return ret
+
+  @property
+  def attributeLayout(self):
+    """
+    the udAttributeLayout of the attributes stored in each voxel of the point cloud
+    """
+    if getattr(self, "_attributeLayout", None) is None:
+      self._attributeLayout = self.header.attributes.layout
+    return self._attributeLayout
+
+  def _overlaps(self, filter):
+    """
+    returns False if the bounds of the udGeometry filter do not intersect the bounding box stored in the header
+    """
+    bounds = filter.bounds() if filter is not None else None
+    if bounds is None:
+      return True
+    minimum, maximum = self.header.world_bounds()
+    return bool(np.all(bounds[0] <= maximum) and np.all(bounds[1] >= minimum))
+
+  def _probe_buffer(self):
+    """
+    context manager lending a single point buffer from a pool shared by all point clouds, so concurrent probes each
+    query into a buffer of their own
+    """
+    if udPointCloud._probePool is None:
+      udPointCloud._probePool = udPointBufferPool()
+    return udPointCloud._probePool.buffer(1, self.header.attributes)
+
+  def _query_context(self, context):
+    """
+    returns context, or the context the point cloud was loaded with if it is None
+    """
+    context = context or self.context
+    if context is None:
+      raise ValueError("A udContext is required to query a point cloud not loaded with one (e.g. from_pointer)")
+    return context
+
+  def has_points_in(self, filter, context: udContext = None):
+    """
+    Returns True if any point of the point cloud lies within the udGeometry filter.
+    Filters that do not overlap the bounding box in the header are rejected without querying, otherwise a query into a
+    single point buffer is executed which stops at the first point found.
+    context defaults to the context the point cloud was loaded with
+    """
+    if not self._overlaps(filter):
+      return False
+    query = udQueryContext(self._query_context(context), self, filter)
+    with self._probe_buffer() as buff:
+      # execute returns whether more points remain, a point found is one written to the buffer:
+      query.execute(buff)
+      return len(buff) > 0
+
+  def count(self, filter, context: udContext = None, limit=None, batchSize=65536):
+    """
+    Returns the exact number of points of the point cloud within the udGeometry filter. This executes the query,
+    streaming every matching point through a buffer of batchSize points, so costs as much as reading the points; use
+    has_points_in to test for any points at all. If limit is given counting stops once at least limit points have been
+    read, and limit is returned. Filters that do not overlap the bounding box in the header return 0 without querying
+    """
+    if not self._overlaps(filter):
+      return 0
+    query = udQueryContext(self._query_context(context), self, filter)
+    count = 0
+    for positions, attributes in query.iter_batches(batchSize, ringSize=1):
+      count += len(positions)
+      if limit is not None and count >= limit:
+        return limit
+    return count
+
+  def probe_tiles(self, filters, context: udContext = None):
+    """
+    Returns a list of booleans indicating which of the udGeometry filters contain at least one point of the point cloud.
+    A single query context and point buffer are reused for every filter not rejected by the header bounding box
+    """
+    ret = []
+    query = None
+    with self._probe_buffer() as buff:
+      for filter in filters:
+        if not self._overlaps(filter):
+          ret.append(False)
+          continue
+        if query is None:
+          query = udQueryContext(self._query_context(context), self, filter)
+        else:
+          query.geometryFilter = filter
+        query.execute(buff)
+        ret.append(len(buff) > 0)
+    return ret
 
   def __del__(self):
     self._unload()
 
 
+class udPointCloudCache:
+  """
+  Cache of loaded point clouds shared between users of the same model.
+  acquire returns the loaded udPointCloud of a path, loading it only if it is not already cached, and counts a reference
+  to it until it is returned with release. Models with no references are kept loaded for reuse until the cache exceeds
+  maxModels models or maxBytes bytes, at which point the least recently used idle models are unloaded.
+  The size of a model is estimated as the size of its file for local files and 0 for remote models.
+  udPointCloudCache.shared() returns a cache shared by the whole process. The cache is safe to use from multiple threads.
+  """
+  _shared = None
+  _sharedLock = threading.Lock()
+
+  class _Entry:
+    def __init__(self):
+      self.pointcloud = None
+      self.references = 1
+      self.size = 0
+      self.error = None
+      self.ready = threading.Event()
+
+  def __init__(self, maxModels=16, maxBytes=None):
+    self.maxModels = maxModels
+    self.maxBytes = maxBytes
+    self._entries = OrderedDict()
+    self._keys = {}
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  @classmethod
+  def shared(cls):
+    """
+    returns the cache shared by the process, created with the default budget on first use
+    """
+    with cls._sharedLock:
+      if cls._shared is None:
+        cls._shared = cls()
+      return cls._shared
+
+  @staticmethod
+  def normalize(path: str):
+    """
+    returns the key identifying the model at path: local paths are made absolute and case normalised, URIs are used as
+    they are
+    """
+    if "://" in path:
+      return path
+    return os.path.normcase(os.path.abspath(path))
+
+  def acquire(self, path: str, context: udContext):
+    """
+    returns the udPointCloud located at path, loading it with context if it is not cached. Each call must be matched by
+    a call to release once the model is no longer used
+    """
+    key = (self.normalize(path), context)
+    with self._lock:
+      entry = self._entries.get(key)
+      load = entry is None
+      if load:
+        self.misses += 1
+        entry = self._entries[key] = self._Entry()
+      else:
+        self.hits += 1
+        entry.references += 1
+        self._entries.move_to_end(key)
+
+    if not load:
+      entry.ready.wait()
+      if entry.error is not None:
+        with self._lock:
+          entry.references -= 1
+        raise entry.error
+      return entry.pointcloud
+
+    try:
+      pointcloud = udPointCloud(path, context)
+    except Exception as e:
+      with self._lock:
+        del self._entries[key]
+      entry.error = e
+      entry.ready.set()
+      raise
+    entry.pointcloud = pointcloud
+    entry.size = os.path.getsize(path) if os.path.isfile(path) else 0
+    with self._lock:
+      self._keys[id(pointcloud)] = key
+      self._evict()
+    entry.ready.set()
+    return pointcloud
+
+  def release(self, pointcloud: udPointCloud):
+    """
+    returns a model obtained from acquire to the cache
+    """
+    with self._lock:
+      key = self._keys.get(id(pointcloud))
+      if key is None:
+        raise ValueError("Point cloud was not acquired from this udPointCloudCache")
+      entry = self._entries[key]
+      if entry.references <= 0:
+        raise ValueError("Point cloud released more times than it was acquired")
+      entry.references -= 1
+      self._evict()
+
+  @contextmanager
+  def open(self, path: str, context: udContext):
+    """
+    context manager acquiring the model at path for the duration of a with block
+    """
+    pointcloud = self.acquire(path, context)
+    try:
+      yield pointcloud
+    finally:
+      self.release(pointcloud)
+
+  def _over_budget(self):
+    if self.maxModels is not None and len(self._entries) > self.maxModels:
+      return True
+    if self.maxBytes is not None and sum(entry.size for entry in self._entries.values()) > self.maxBytes:
+      return True
+    return False
+
+  def _evict(self, everything=False):
+    """
+    unloads idle models from the least recently used until the cache is within budget. Must be called with the lock held
+    """
+    for key, entry in list(self._entries.items()):
+      if not everything and not self._over_budget():
+        return
+      if entry.references or entry.pointcloud is None:
+        continue
+      del self._entries[key]
+      del self._keys[id(entry.pointcloud)]
+      self.evictions += 1
+
+  def clear(self):
+    """
+    unloads all models without references
+    """
+    with self._lock:
+      self._evict(everything=True)
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __contains__(self, path: str):
+    with self._lock:
+      return any(key[0] == self.normalize(path) for key in self._entries)
+
+  def stats(self):
+    """
+    returns a dictionary of the cache counters
+    """
+    with self._lock:
+      return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "models": len(self._entries),
+              "inUse": sum(1 for entry in self._entries.values() if entry.references),
+              "bytes": sum(entry.size for entry in self._entries.values())}
+
+
 class _udPointBuffer():
   """
   Structure used for reading and writing points to UDS.
   """
 
+  def _as_array(self, address, dtype, shape, strides=None):
+    """
+    returns a numpy array of shape and dtype mapped directly onto the memory at address. The returned array holds a
+    reference to this buffer so the underlying memory is not freed while the array is in use
+    """
+    dtype = np.dtype(dtype)
+    if not address or not shape[0]:
+      return np.zeros(shape, dtype)
+    if strides is None:
+      nBytes = int(np.prod(shape)) * dtype.itemsize
+    else:
+      nBytes = (shape[0] - 1) * strides[0] + int(np.prod(shape[1:])) * dtype.itemsize
+    cArray = (ctypes.c_ubyte * nBytes).from_address(address)
+    cArray._owner = self
+    return np.ndarray(shape, dtype, buffer=cArray, strides=strides)
+
+  def _build_attribute_layout(self):
+    """
+    resolves the layout of the attributes of the buffer and creates the accessors and structured numpy dtype describing
+    the attributes of a single point
+    """
+    self.attributeLayout = self.pStruct.contents.attributes.layout
+    self._attributeDtype = self.attributeLayout.dtype(self.pStruct.contents.attributeStride)
+    self.attrAccessors = {}
+    for attribute in self.attributeLayout:
+      self.attrAccessors[attribute.name] = udAttributeAccessor(self, attribute.index)
+
   @property
   def positions(self):
     """
     The positions of the points contained in the buffer as a (number of points) * 3 numpy array
     """
-    ret = np.ctypeslib.as_array(self.pStruct.contents.pPositions, (self.pStruct.contents.pointCount, 3))
-    ret.dtype = self.dtype
-    return ret
+    contents = self.pStruct.contents
+    dtype = np.dtype(self.dtype)
+    return self._as_array(ctypes.cast(contents.pPositions, ctypes.c_void_p).value, dtype, (contents.pointCount, 3),
+                          (contents.positionStride, dtype.itemsize))
+
+  @property
+  def attributeDtype(self):
+    """
+    Structured numpy dtype describing the layout of the attributes of a single point in the buffer
+    """
+    return self._attributeDtype
+
+  @property
+  def attributeArray(self):
+    """
+    The attributes of the points contained in the buffer as a structured numpy array of length (number of points).
+    The array is a view of the buffer memory: writing to it modifies the points stored in the buffer
+    """
+    contents = self.pStruct.contents
+    return self._as_array(contents.pAttributes, self._attributeDtype, (contents.pointCount,))
+
+  def get_attribute_array(self, attributeName: str):
+    """
+    returns the values of the attribute attributeName for every point in the buffer as a strided numpy view of the
+    buffer memory
+    """
+    return self.attributeArray[attributeName]
 
   def __len__(self):
     return self.pStruct.contents.pointCount
@@ -1311,136 +2600,50 @@ class _udPointBuffer():
     self.pStruct.contents.pointCount += 1
 
 
-class __udPointBufferI64(_udPointBuffer):
-  """
-  Not implemented
-  """
-  class _udPointBufferI64(ctypes.Structure):
-    _fields_ = [
-      ("pPositions", ctypes.POINTER(ctypes.c_int64)),  # !< Flat array of XYZ positions in the format XYZXYZXYZXYZXYZXYZXYZ...
-      ("pAttributes", ctypes.POINTER(ctypes.c_byte)),
-      ("attributes", udAttributeSet),  # !< Information on the attributes that are available in this point buffer
-      ("positionStride", ctypes.c_uint32),
-      # !< Total bytes between the start of one position and the start of the next (currently always 24 (8 bytes per int64 * 3 int64))
-      ("attributeStride", ctypes.c_uint32),
-      # !< Total number of bytes between the start of the attibutes of one point and the first byte of the next attribute
-      ("pointCount", ctypes.c_uint32),  # !< How many points are currently contained in this buffer
-      ("pointsAllocated", ctypes.c_uint32),  # !< Total number of points that can fit in this udPointBufferF64
-      ("_reserved", ctypes.c_uint32)  # !< Reserved for internal use
-    ]
-  pStruct = ctypes.POINTER(_udPointBufferI64)()#pointer(_udPointBufferI64)
-  dtype = "i8"
-
-
-  def __init__(self, maxPoints, attributeSet=None):
-    raise NotImplementedError
-    self.udPointBufferI64_Create = udExceptionDecorator(udSDKlib.udPointBufferI64_Create)
-    self.udPointBufferI64_Destroy = udExceptionDecorator(udSDKlib.udPointBufferI64_Destroy)
-    self.udPointBufferI64_Create(byref(self.pStruct), maxPoints, attributeSet)
-    super(udPointBufferI64, self).__init__()
-
-  def __del__(self):
-    if self.pStruct is not None and self.isReference:
-      self.udPointBufferI64_Destroy(ctypes.byref(self.pStruct))
-
 class udAttributeAccessor():
   """
   class representing the array of a particular attribute stored in a udPointBuffer.
-  Implements iterator interface and read and writing of values into the underlying buffer
+  Implements iterator interface and read and writing of values into the underlying buffer.
+  Integer indices read and write single values; slices, index arrays and boolean masks are read as numpy arrays and
+  written in a single vectorized assignment to the buffer memory
   """
   def __init__(self, buffer:_udPointBuffer, descriptorIndex, start=None, stop=None, step=1):
     self.buffer = buffer
     self.attributeStride = buffer.pStruct.contents.attributeStride
     self.descriptor = buffer.pStruct.contents.attributes.pDescriptors[descriptorIndex]
-    self.attributeOffset = buffer.pStruct.contents.attributes.get_offset(self.descriptor.name.decode('utf8'))
-    self.typeInfo = udAttributeTypeInfo(self.descriptor.typeInfo)
-
-    self._start = start
-    self._stop = stop
-    if step is None:
-      step = 1
-
-    self.step = step
+    attribute = buffer.attributeLayout[descriptorIndex]
+    self.attributeName = attribute.name
+    self.attributeOffset = attribute.offset
+    self.typeInfo = attribute.typeInfo
     self.descriptorIndex = descriptorIndex
+    self._slice = slice(start, stop, step)
 
   @property
-  def stop(self):
-    if self._stop is None:
-      return self.buffer.pStruct.contents.pointCount - 1
-    if self._stop >= 0:
-      ret = self._stop - 1
-    else:
-      ret = self._stop + self.buffer.pStruct.contents.pointCount - 1
-    if ret > self.buffer.pStruct.contents.pointCount:
-      raise IndexError("iteration stop out of bounds")
-    return ret
+  def array(self):
+    """
+    The values of this attribute as a numpy array mapped onto the buffer memory
+    """
+    return self.buffer.get_attribute_array(self.attributeName)[self._slice]
 
-  @property
-  def start(self):
-    if self._start is None:
-      return 0
-    if self._start >= 0:
-      ret = self._start
-    else:
-      ret = self._start + self.buffer.pStruct.contents.pointCount
-    if ret > self.buffer.pStruct.contents.pointCount:
-      raise IndexError("iteration start out of bounds")
-    return ret
+  def __array__(self, dtype=None, copy=None):
+    if dtype is None:
+      return self.array
+    return self.array.astype(dtype)
 
   def __iter__(self):
-    self._counter = 0
-    return self
-
-  def __next__(self):
-    if self._counter >= len(self):
-      raise StopIteration
-    else:
-      ret = self[self._counter]
-      self._counter += 1
-      return ret
-
-  def _getPtr(self, item):
-    """
-    returns the pointer to the object at for integer item numbers or another view into the array
-    """
-    if type(item) == slice:
-      if item.step is not None:
-        step = item.step
-      else:
-        step = 1
-      return udAttributeAccessor(self.buffer, self.descriptorIndex, item.start, item.stop, step)
-    elif type(item) == int:
-      if(item > len(self)):
-        raise IndexError
-      start = item * self.step + self.start
-    else:
-      raise TypeError
-    if start < 0:
-      start = self.buffer.pStruct.contents.pointCount + start
-    if start >= self.buffer.pStruct.contents.pointCount or start < 0:
-      raise IndexError
-    offset = start * self.attributeStride + self.attributeOffset
-    return ctypes.cast(ctypes.c_void_p(self.buffer.pStruct.contents.pAttributes + offset), ctypes.POINTER(self.typeInfo.to_ctype())).contents
+    return iter(self.array.tolist())
 
   def __getitem__(self, item):
-    ret = self._getPtr(item)
-    if type(ret) == udAttributeAccessor:
-      return ret
-    else:
-      return ret.value
+    ret = self.array[item]
+    if isinstance(ret, np.generic):
+      return ret.item()
+    return ret
 
   def __setitem__(self, key, value):
-    item = self._getPtr(key)
-    if type(item) == udAttributeAccessor:
-      if len(item) != len(value):
-        raise Exception("slice to be replaced must be the same length as value")
-      for i in range(len(item)):
-        item[i] = value[i]
-    else:
-      item.value = value
+    self.array[key] = value
 
   def __len__(self):
-    return (self.stop-self.start)//self.step + 1
+    return len(self.array)
 
 
 class udPointBufferF64(_udPointBuffer):
@@ -1475,12 +2678,9 @@ class udPointBufferF64(_udPointBuffer):
       self.isReference = False
     else:
       self.pStruct = pStruct
-      attributeSet = pStruct.contents.attributes
       self.isReference = True
 
-    self.attrAccessors = {}
-    for i, attr in enumerate(attributeSet):
-      self.attrAccessors[attr.name.decode('utf8')] = udAttributeAccessor(self, i)
+    self._build_attribute_layout()
     super(udPointBufferF64, self).__init__()
 
   def __del__(self):
@@ -1488,6 +2688,178 @@ class udPointBufferF64(_udPointBuffer):
       self.udPointBufferF64_Destroy(ctypes.byref(self.pStruct))
 
 
+class udPointBufferI64(_udPointBuffer):
+  """
+  Buffer containing points to be passed either to or from UD. Positions are encoded as 64 bit integers in the quantized
+  space of the point cloud, world_positions and set_world_positions convert to and from world space using the point
+  cloud header.
+  """
+  class _udPointBufferI64(ctypes.Structure):
+    _fields_ = [
+      ("pPositions", ctypes.POINTER(ctypes.c_int64)),  # !< Flat array of XYZ positions in the format XYZXYZXYZXYZXYZXYZXYZ...
+      ("pAttributes", ctypes.c_void_p),
+      ("attributes", udAttributeSet),  # !< Information on the attributes that are available in this point buffer
+      ("positionStride", ctypes.c_uint32),
+      # !< Total bytes between the start of one position and the start of the next (currently always 24 (8 bytes per int64 * 3 int64))
+      ("attributeStride", ctypes.c_uint32),
+      # !< Total number of bytes between the start of the attibutes of one point and the first byte of the next attribute
+      ("pointCount", ctypes.c_uint32),  # !< How many points are currently contained in this buffer
+      ("pointsAllocated", ctypes.c_uint32),  # !< Total number of points that can fit in this udPointBufferI64
+      ("_reserved", ctypes.c_uint32)  # !< Reserved for internal use
+    ]
+  dtype = "i8"
+
+  def __init__(self, maxPoints=0, attributeSet=None, pStruct=None):
+    """
+    Creates a point buffer with maxPoints allocated to it with the attributes defined by attributeSet.
+    If pStruct is defined instead instantiate the object with the internal value located at this address
+    """
+    self.udPointBufferI64_Create = udExceptionDecorator(udSDKlib.udPointBufferI64_Create)
+    self.udPointBufferI64_Destroy = udExceptionDecorator(udSDKlib.udPointBufferI64_Destroy)
+    if pStruct is None:
+      self.pStruct = ctypes.POINTER(self._udPointBufferI64)()
+      self.udPointBufferI64_Create(ctypes.byref(self.pStruct), maxPoints, attributeSet)
+      self.isReference = False
+    else:
+      self.pStruct = pStruct
+      self.isReference = True
+
+    self._build_attribute_layout()
+    super(udPointBufferI64, self).__init__()
+
+  def __del__(self):
+    if self.pStruct and not self.isReference:
+      self.udPointBufferI64_Destroy(ctypes.byref(self.pStruct))
+
+  @staticmethod
+  def quantization(header: udPointCloudHeader):
+    """
+    returns the (scale, offset) pair mapping integer positions of the point cloud described by header to world space
+    such that world = position * scale + offset
+    """
+    scale = header.scaledRange / (1 << header.totalLODLayers)
+    return scale, np.array(header.baseOffset)
+
+  def world_positions(self, header: udPointCloudHeader):
+    """
+    The positions of the points contained in the buffer converted to world space as a (number of points) * 3 float64
+    numpy array
+    """
+    scale, offset = self.quantization(header)
+    return self.positions * scale + offset
+
+  def set_world_positions(self, worldPositions, header: udPointCloudHeader):
+    """
+    Quantizes the world space (number of points) * 3 array worldPositions into the integer positions of the buffer
+    """
+    scale, offset = self.quantization(header)
+    self.positions[:] = np.rint((np.asarray(worldPositions) - offset) / scale)
+
+
+class udPointBufferPool:
+  """
+  Pool of reusable point buffers keyed by (buffer type, capacity, attribute set signature).
+  Buffers are handed out empty by acquire or the buffer context manager and returned with release for reuse by later
+  requests of the same layout, avoiding repeated native creation and destruction in query loops and exporters.
+  The pool is safe to use from multiple threads.
+  """
+  def __init__(self, maxIdle=8):
+    """
+    maxIdle: the number of idle buffers retained for each key, further released buffers are destroyed
+    """
+    self.maxIdle = maxIdle
+    self._idle = {}
+    self._outstandingIds = set()  # id() of the buffers currently handed out by this pool
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.outstanding = 0
+    self.peakOutstanding = 0
+
+  @staticmethod
+  def _key(bufferType, maxPoints, attributeSet):
+    return bufferType, int(maxPoints), attributeSet.signature if attributeSet is not None else None
+
+  def acquire(self, maxPoints, attributeSet: udAttributeSet = None, bufferType=udPointBufferF64):
+    """
+    returns an empty buffer of bufferType with capacity maxPoints and attributes attributeSet, reusing an idle buffer
+    of the same layout if one is available. The buffer should be returned with release once it is no longer in use
+    """
+    key = self._key(bufferType, maxPoints, attributeSet)
+    with self._lock:
+      idle = self._idle.get(key)
+      buffer = idle.pop() if idle else None
+      if buffer is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+      self.outstanding += 1
+      self.peakOutstanding = max(self.peakOutstanding, self.outstanding)
+    if buffer is None:
+      try:
+        buffer = bufferType(maxPoints, attributeSet=attributeSet)
+      except Exception:
+        with self._lock:
+          self.outstanding -= 1
+        raise
+      buffer._poolKey = key
+    with self._lock:
+      self._outstandingIds.add(id(buffer))
+    buffer.pStruct.contents.pointCount = 0
+    return buffer
+
+  def release(self, buffer: _udPointBuffer):
+    """
+    returns a buffer obtained from acquire to the pool. The buffer and any arrays viewing it must not be used afterwards.
+    Raises ValueError if the buffer is not currently handed out by this pool, such as when it is released twice
+    """
+    with self._lock:
+      if id(buffer) not in self._outstandingIds:
+        raise ValueError("Buffer is not outstanding from this udPointBufferPool")
+      self._outstandingIds.remove(id(buffer))
+      key = buffer._poolKey
+      self.outstanding -= 1
+      idle = self._idle.setdefault(key, [])
+      if len(idle) < self.maxIdle:
+        idle.append(buffer)
+
+  @contextmanager
+  def buffer(self, maxPoints, attributeSet: udAttributeSet = None, bufferType=udPointBufferF64):
+    """
+    context manager acquiring a buffer for the duration of a with block, e.g.
+    with pool.buffer(100000, pointcloud.header.attributes) as buff:
+      query.execute(buff)
+    """
+    buff = self.acquire(maxPoints, attributeSet, bufferType)
+    try:
+      yield buff
+    finally:
+      self.release(buff)
+
+  @property
+  def idle(self):
+    """
+    the number of idle buffers currently held by the pool
+    """
+    with self._lock:
+      return sum(len(buffers) for buffers in self._idle.values())
+
+  def clear(self):
+    """
+    destroys all idle buffers held by the pool
+    """
+    with self._lock:
+      self._idle = {}
+
+  def stats(self):
+    """
+    returns a dictionary of the pool counters
+    """
+    with self._lock:
+      return {"hits": self.hits, "misses": self.misses, "outstanding": self.outstanding,
+              "peakOutstanding": self.peakOutstanding, "idle": sum(len(b) for b in self._idle.values())}
+
+
 class udQueryContext:
   """
   Class enabling the querying of pointcloud for points matching a geometry filter
@@ -1508,9 +2880,10 @@ class udQueryContext:
     self._create()
 
   def _create(self):
+    pGeometry = ctypes.c_void_p(0) if self._filter is None else self._filter.pGeometry
     _HandleReturnValue(
       self.udQueryContext_Create(self.context.pContext, ctypes.byref(self.pQueryContext), self._pointcloud.pPointCloud,
-                                 self._filter.pGeometry))
+                                 pGeometry))
   @property
   def geometryFilter(self):
     """
@@ -1539,13 +2912,16 @@ class udQueryContext:
     self._pointcloud = pointcloud
     _HandleReturnValue(self.udQueryContext_ChangePointCloud(self.pQueryContext, pointcloud.pPointCloud))
 
-  def execute(self, points: udPointBufferF64):
+  def execute(self, points: _udPointBuffer):
     """
-    Fill the point buffer with points matching the query from the pointcloud. Calling this function repeatedly will
-    replace the buffer contents with additional points matching the query.
+    Fill the point buffer (udPointBufferF64 or udPointBufferI64) with points matching the query from the pointcloud.
+    Calling this function repeatedly will replace the buffer contents with additional points matching the query.
     Returns False when no more points match the query.
     """
-    retVal = self.udQueryContext_ExecuteF64(self.pQueryContext, points.pStruct)
+    if isinstance(points, udPointBufferI64):
+      retVal = self.udQueryContext_ExecuteI64(self.pQueryContext, points.pStruct)
+    else:
+      retVal = self.udQueryContext_ExecuteF64(self.pQueryContext, points.pStruct)
     if retVal == udError.NotFound:
       return False
     _HandleReturnValue(retVal)
@@ -1554,20 +2930,83 @@ class udQueryContext:
   def _destroy(self):
     _HandleReturnValue(self.udQueryContext_Destroy(ctypes.byref(self.pQueryContext)))
 
-  def load_all_points(self, bufferSize=100000):
+  def __del__(self):
+    if getattr(self, "pQueryContext", None):
+      self._destroy()
+
+  def load_all_points(self, bufferSize=100000, bufferType=udPointBufferF64):
     """
     This loads all points matching the query into a list of point buffers of size bufferSize.
-    Large queries may result in the caller running out of memory.
+    bufferType selects between udPointBufferF64 and udPointBufferI64.
+    Large queries may result in the caller running out of memory, iter_batches processes queries of any size in bounded
+    memory.
     """
     #raise NotImplementedError("this function does not currently work correctly")
     res = True
     while res:
-      buff = udPointBufferF64(bufferSize, attributeSet=self._pointcloud.header.attributes)
+      buff = bufferType(bufferSize, attributeSet=self._pointcloud.header.attributes)
       res = self.execute(buff)
       if res:
         self.resultBuffers.append(buff)
     return self.resultBuffers
 
+  def iter_batches(self, batchSize=100000, reuse=True, ringSize=2, bufferType=udPointBufferF64, buffers=None,
+                   pool: udPointBufferPool = None):
+    """
+    Generator executing the query in batches of up to batchSize points. Yields (positions, attributes) for each batch
+    where positions is the (number of points) * 3 positions array and attributes the structured attribute array of the
+    buffer the batch was read into.
+
+    With reuse the batches are read into a fixed ring of ringSize buffers, so memory use is bounded regardless of the
+    size of the query. The arrays of a batch are views of the buffer memory and are overwritten ringSize batches later;
+    copy them if they are needed for longer than that.
+    Without reuse a new buffer is allocated for each batch and the arrays remain valid for as long as they are referenced.
+    buffers optionally supplies an existing ring of buffers to read into in place of allocating one.
+    pool optionally supplies a udPointBufferPool the ring is acquired from and returned to once iteration ends.
+    """
+    attributes = self._pointcloud.header.attributes
+    ring = []
+    pooled = []
+    if buffers:
+      ring = buffers
+      reuse = True
+    elif reuse and pool is not None:
+      ring = pooled = [pool.acquire(batchSize, attributes, bufferType) for i in range(max(1, ringSize))]
+    elif reuse:
+      ring = [bufferType(batchSize, attributeSet=attributes) for i in range(max(1, ringSize))]
+
+    try:
+      batchIndex = 0
+      while True:
+        if reuse:
+          buff = ring[batchIndex % len(ring)]
+        else:
+          buff = bufferType(batchSize, attributeSet=attributes)
+        if not self.execute(buff) or len(buff) == 0:
+          return
+        batchIndex += 1
+        yield buff.positions, buff.attributeArray
+    finally:
+      for buff in pooled:
+        pool.release(buff)
+
+  def reduce(self, reducer, batchSize=100000, bufferType=udPointBufferF64):
+    """
+    Passes each batch of points matching the query to reducer.update(positions, attributes) without retaining the
+    batches, then returns the reducer. See udSDKQuery.udQueryStatistics
+    """
+    for positions, attributes in self.iter_batches(batchSize, bufferType=bufferType):
+      reducer.update(positions, attributes)
+    return reducer
+
+  def export_npy(self, directory: str, batchSize=1000000, chunkPoints=1 << 22, bufferType=udPointBufferF64):
+    """
+    Streams the points matching the query into a directory of memory mapped .npy files with one file per column and a
+    manifest describing them. See udSDKQuery.export_npy
+    """
+    import udSDKQuery
+    return udSDKQuery.export_npy(self, directory, batchSize, chunkPoints, bufferType)
+
 class udStreamer(ctypes.Structure):
   """
   Class representing the status of the UD streamer
@@ -1636,27 +3075,190 @@ class udRenderBuffer():
 
   def rgb_colour_buffer(self):
     """returns the colour buffer as a list of (r, g, b) tuples"""
-    out = []
-    for colour in self.colourBuffer:
-      out.append((colour >> 16 & 0xFF, colour >> 8 & 0xFF, colour & 0xFF))
-    return out
+    return list(map(tuple, self.colour_array("RGB").reshape(-1, 3).tolist()))
+
+  def colour_array(self, channelOrder="BGRA", out=None):
+    """
+    returns the colour buffer as a (height, width, channels) uint8 numpy array, see udRenderTarget.colour_array
+    """
+    return _colour_array(self.colourBuffer, self._width, self._height, channelOrder, out)
+
+  def depth_array(self, out=None):
+    """
+    returns the depth buffer as a (height, width) float32 numpy array viewing the buffer without copying, or copied into
+    out if given
+    """
+    return _depth_array(self.depthBuffer, self._width, self._height, out)
 
   def plot_matplotlib(self):
     """plots the current view as an rgb image in matplotlib"""
     if self.colourBuffer is None:
       raise Exception("No Colour Buffer")
     import matplotlib.pyplot as plt
-    im = np.array(self.rgb_colour_buffer()).reshape([self.height, self.width, 3])
+    im = self.colour_array("RGB")
     plt.figure()
     plt.imshow(im)
     plt.show()
 
-  def save_to_png(self, filename):
+  def save_to_png(self, filename, writer=None):
     """
-    saves the current colour buffer as a PNG
+    saves the current colour buffer as a PNG.
+    If a udSDKRender.udFrameWriter writer is given the buffer is snapshotted and encoded by the writer in the background,
+    filename must then end in .png; the path to be written is returned, or None if the writer dropped the frame
     """
+    if writer is not None:
+      root, extension = os.path.splitext(filename)
+      if extension.lower() != '.png':
+        raise ValueError("A udFrameWriter only writes .png files, got {}".format(filename))
+      path = writer.submit(self, root)
+      return None if path is None else path + '.png'
     from PIL import Image
-    Image.frombuffer("RGBA", (self.width, self.height), self.colourBuffer, "raw", "RGBA", 0, 1).save(filename)
+    Image.fromarray(self.colour_array("RGBA"), "RGBA").save(filename)
+
+
+class udRenderFrame:
+  """
+  Read only handle to a completed frame of a udSwapChainRenderBuffer.
+  The buffers of the frame are not rendered to again until the frame is released
+  """
+  def __init__(self, swapChain, pair):
+    self._swapChain = swapChain
+    self._pair = pair
+    self.frameNumber = pair.frameNumber
+    self.width = pair.width
+    self.height = pair.height
+
+  def colour_array(self, channelOrder="BGRA", out=None):
+    """
+    returns the colour buffer of the frame as a (height, width, channels) uint8 numpy array, see
+    udRenderTarget.colour_array. Views of the buffer are read only
+    """
+    ret = _colour_array(self._pair.colourBuffer, self.width, self.height, channelOrder, out)
+    if out is None and channelOrder != "RGBA":
+      ret.flags.writeable = False
+    return ret
+
+  def depth_array(self, out=None):
+    """
+    returns the depth buffer of the frame as a read only (height, width) float32 numpy array, or copied into out
+    """
+    ret = _depth_array(self._pair.depthBuffer, self.width, self.height, out)
+    if out is None:
+      ret.flags.writeable = False
+    return ret
+
+  def release(self):
+    """
+    allows the buffers of the frame to be rendered to again. Arrays viewing the frame must not be used afterwards
+    """
+    if self._pair is not None:
+      self._swapChain._unpin(self._pair)
+      self._pair = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.release()
+
+
+class udSwapChainRenderBuffer(udRenderBuffer):
+  """
+  udRenderBuffer holding count preallocated pairs of colour and depth buffers.
+  Each render is performed into a different pair, so the last completed frame can be read through last_frame while the
+  next frame renders. Buffers are only reallocated when the size of the render target changes.
+  Renders should be performed with render, or set_as_target followed by udRenderContext.render and present.
+  """
+  class _Pair:
+    __slots__ = ("colourBuffer", "depthBuffer", "width", "height", "frameNumber", "pins")
+
+    def __init__(self, width, height, hasColourBuffer):
+      self.colourBuffer = (ctypes.c_uint32 * (height * width))() if hasColourBuffer else None
+      self.depthBuffer = (ctypes.c_float * (height * width))()
+      self.width = width
+      self.height = height
+      self.frameNumber = 0
+      self.pins = 0
+
+  def __init__(self, renderTarget: udRenderTarget, count=3, hasColourBuffer=True):
+    if count < 2:
+      raise ValueError("A swap chain requires at least 2 buffers")
+    self.count = count
+    self.frameNumber = 0
+    self._lock = threading.Lock()
+    self._pairs = []
+    self._bound = None
+    self._completed = None
+    super(udSwapChainRenderBuffer, self).__init__(renderTarget, hasColourBuffer)
+
+  def _resize(self):
+    self._height = self._renderTarget.height
+    self._width = self._renderTarget.width
+    with self._lock:
+      # frames of the previous size remain valid until released as they hold their own buffers
+      self._pairs = [self._Pair(self._width, self._height, self._hasColourBuffer) for i in range(self.count)]
+      self._bound = self._pairs[0]
+      self._completed = None
+    self.colourBuffer = self._bound.colourBuffer
+    self.depthBuffer = self._bound.depthBuffer
+
+  def _next(self):
+    """
+    returns the pair least recently rendered to that is neither the last completed frame nor held by a reader
+    """
+    with self._lock:
+      free = [pair for pair in self._pairs if not pair.pins and pair is not self._completed]
+      if not free:
+        raise BufferError("All buffers of the swap chain are in use")
+      return min(free, key=lambda pair: pair.frameNumber)
+
+  def set_as_target(self, renderTarget: udRenderTarget = None):
+    """
+    Binds the next free pair of buffers to the render target, reallocating the buffers only if the size of the render
+    target has changed
+    """
+    if renderTarget is not None:
+      self._renderTarget = renderTarget
+    if self._width != self.width or self._height != self.height:
+      self._resize()
+    self._bound = self._next()
+    self.colourBuffer = self._bound.colourBuffer
+    self.depthBuffer = self._bound.depthBuffer
+    self._renderTarget.SetTargets(self.colourBuffer, self.clearColour, self.depthBuffer)
+
+  def present(self):
+    """
+    Marks the frame rendered into the bound buffers as the last completed frame
+    """
+    with self._lock:
+      self.frameNumber += 1
+      self._bound.frameNumber = self.frameNumber
+      self._completed = self._bound
+
+  def render(self, renderContext: udRenderContext, renderInstances, renderSettings=None):
+    """
+    Renders renderInstances into the next free pair of buffers and presents the result. Returns the frame number
+    """
+    self.set_as_target()
+    renderContext.render(self._renderTarget, renderInstances, renderSettings)
+    self.present()
+    return self.frameNumber
+
+  def last_frame(self):
+    """
+    Returns a udRenderFrame of the last completed frame, or None if no frame has been completed. The buffers of the frame
+    are not rendered to until it is released
+    """
+    with self._lock:
+      pair = self._completed
+      if pair is None:
+        return None
+      pair.pins += 1
+    return udRenderFrame(self, pair)
+
+  def _unpin(self, pair):
+    with self._lock:
+      pair.pins -= 1
 
 
 class udConfig:
@@ -0,0 +1,313 @@
+import fnmatch
+import json
+import logging
+import math
+import os
+
+import numpy as np
+
+import udSDK
+import udSDKGeometry
+
+logger = logging.getLogger(__name__)
+
+
+class _udSTRTree:
+  """
+  Static R-tree over axis aligned boxes bulk loaded using Sort-Tile-Recursive packing.
+  Boxes are stored in leaf order, node i of each level bounds nodes [i * fanout, (i + 1) * fanout) of the level below, so
+  the tree is fully described by the box order and the fanout.
+  """
+  def __init__(self, minimums, maximums, fanout=16):
+    """
+    builds the levels of the tree over boxes already in leaf order (see str_order)
+    """
+    self.fanout = fanout
+    self.levels = [(np.asarray(minimums, dtype=float).reshape(-1, 3), np.asarray(maximums, dtype=float).reshape(-1, 3))]
+    while len(self.levels[-1][0]) > fanout:
+      minimums, maximums = self.levels[-1]
+      groups = np.arange(0, len(minimums), fanout)
+      self.levels.append((np.minimum.reduceat(minimums, groups), np.maximum.reduceat(maximums, groups)))
+
+  @staticmethod
+  def str_order(minimums, maximums, fanout=16):
+    """
+    returns the permutation of the boxes placing them in Sort-Tile-Recursive order: sorted into vertical slices by the x
+    of their centres, then by y within each slice
+    """
+    centres = (np.asarray(minimums, dtype=float) + np.asarray(maximums, dtype=float)) / 2
+    count = len(centres)
+    if not count:
+      return np.zeros(0, dtype=int)
+    leaves = math.ceil(count / fanout)
+    sliceSize = math.ceil(math.sqrt(leaves)) * fanout
+    byX = np.argsort(centres[:, 0], kind="stable")
+    slices = [byX[i:i + sliceSize] for i in range(0, count, sliceSize)]
+    return np.concatenate([s[np.argsort(centres[s, 1], kind="stable")] for s in slices])
+
+  def query(self, minimum, maximum):
+    """
+    returns the sorted indices (in leaf order) of the boxes intersecting the box (minimum, maximum)
+    """
+    if not len(self.levels[0][0]):
+      return np.zeros(0, dtype=int)
+    minimum = np.asarray(minimum, dtype=float)
+    maximum = np.asarray(maximum, dtype=float)
+    candidates = np.arange(len(self.levels[-1][0]))
+    for depth in range(len(self.levels) - 1, -1, -1):
+      minimums, maximums = self.levels[depth]
+      hit = np.all(minimums[candidates] <= maximum, axis=1) & np.all(maximums[candidates] >= minimum, axis=1)
+      candidates = candidates[hit]
+      if depth:
+        children = (candidates[:, None] * self.fanout + np.arange(self.fanout)).ravel()
+        candidates = children[children < len(self.levels[depth - 1][0])]
+    return candidates
+
+
+def _boxes_intersect_polygon(minimums, maximums, polygon):
+  """
+  returns a boolean array of which of the XY footprints of the boxes intersect the XY polygon
+  """
+  polygon = np.asarray(polygon, dtype=float)[:, :2]
+  starts = polygon
+  ends = np.roll(polygon, -1, axis=0)
+  ret = np.zeros(len(minimums), dtype=bool)
+  for i, (lo, hi) in enumerate(zip(minimums[:, :2], maximums[:, :2])):
+    # a polygon vertex inside the box:
+    if np.any(np.all((polygon >= lo) & (polygon <= hi), axis=1)):
+      ret[i] = True
+      continue
+    # the box centre inside the polygon (even-odd rule), covering boxes containing no vertex or edge crossing:
+    x, y = (lo + hi) / 2
+    crosses = (starts[:, 1] > y) != (ends[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+      xCross = starts[:, 0] + (y - starts[:, 1]) * (ends[:, 0] - starts[:, 0]) / (ends[:, 1] - starts[:, 1])
+    if np.count_nonzero(crosses & (x < xCross)) % 2:
+      ret[i] = True
+      continue
+    # an edge crossing the box, clipping each edge against the box (Liang-Barsky):
+    direction = ends - starts
+    t0 = np.zeros(len(starts))
+    t1 = np.ones(len(starts))
+    for axis in range(2):
+      with np.errstate(divide="ignore", invalid="ignore"):
+        a = (lo[axis] - starts[:, axis]) / direction[:, axis]
+        b = (hi[axis] - starts[:, axis]) / direction[:, axis]
+      parallel = direction[:, axis] == 0
+      outside = parallel & ((starts[:, axis] < lo[axis]) | (starts[:, axis] > hi[axis]))
+      t0 = np.where(parallel, t0, np.maximum(t0, np.minimum(a, b)))
+      t1 = np.where(parallel, t1, np.minimum(t1, np.maximum(a, b)))
+      t1 = np.where(outside, -1, t1)
+    ret[i] = bool(np.any(t0 <= t1))
+  return ret
+
+
+class udCatalog:
+  """
+  Persistent spatial index of the headers of a collection of UDS models.
+  The world bounds, resolution, attributes and metadata of each model are recorded along with the modification time
+  and size of its file in a JSON index, so models can be found by location without loading them. refresh only opens
+  files that are new or have changed since they were last recorded.
+  Spatial queries are answered by an R-tree bulk loaded over the model bounds.
+  """
+  version = 1
+
+  def __init__(self, indexPath: str, fanout=16):
+    """
+    indexPath: the location of the JSON index, loaded if it exists
+    fanout: the number of children of each R-tree node
+    """
+    self.indexPath = indexPath
+    self.fanout = fanout
+    self.models = []
+    self._byPath = {}
+    self._tree = _udSTRTree(np.zeros((0, 3)), np.zeros((0, 3)), fanout)
+    if os.path.exists(indexPath):
+      self.load()
+
+  @staticmethod
+  def _key(path: str):
+    return os.path.normcase(os.path.abspath(path))
+
+  def _build(self, models, ordered=False):
+    """
+    sets the models of the catalog and builds the R-tree over them. Unless ordered is set the models are first sorted
+    into Sort-Tile-Recursive order
+    """
+    minimums = np.array([model["minimum"] for model in models], dtype=float).reshape(-1, 3)
+    maximums = np.array([model["maximum"] for model in models], dtype=float).reshape(-1, 3)
+    if not ordered:
+      order = _udSTRTree.str_order(minimums, maximums, self.fanout)
+      models = [models[i] for i in order]
+      minimums = minimums[order]
+      maximums = maximums[order]
+    self.models = models
+    self._byPath = {model["path"]: model for model in models}
+    self._tree = _udSTRTree(minimums, maximums, self.fanout)
+
+  def load(self):
+    """
+    reads the index from indexPath
+    """
+    with open(self.indexPath, "r") as f:
+      index = json.load(f)
+    if index.get("version") != self.version:
+      raise ValueError(f"Unsupported catalog version {index.get('version')}")
+    self.fanout = index["fanout"]
+    # models are stored in leaf order so the tree is rebuilt without sorting
+    self._build(index["models"], ordered=True)
+
+  def save(self):
+    """
+    writes the index to indexPath, replacing the previous index only once it has been written completely
+    """
+    directory = os.path.dirname(os.path.abspath(self.indexPath))
+    os.makedirs(directory, exist_ok=True)
+    temporaryPath = self.indexPath + ".tmp"
+    with open(temporaryPath, "w") as f:
+      json.dump({"version": self.version, "fanout": self.fanout, "models": self.models}, f)
+    os.replace(temporaryPath, self.indexPath)
+
+  @staticmethod
+  def record(path: str, pointcloud: udSDK.udPointCloud, stat: os.stat_result = None):
+    """
+    returns the catalog entry of the loaded pointcloud located at path
+    """
+    if stat is None:
+      stat = os.stat(path)
+    header = pointcloud.header
+    minimum, maximum = header.world_bounds()
+    try:
+      metadata = pointcloud.metadata
+    except (udSDK.UdException, ValueError):
+      metadata = {}
+    return {
+      "path": udCatalog._key(path),
+      "mtime": stat.st_mtime_ns,
+      "size": stat.st_size,
+      "minimum": minimum.tolist(),
+      "maximum": maximum.tolist(),
+      "resolution": header.convertedResolution,
+      "scaledRange": header.scaledRange,
+      "unitMeterScale": header.unitMeterScale,
+      "attributes": header.attributes.names,
+      "metadata": metadata,
+    }
+
+  @staticmethod
+  def _find(locations, pattern, recursive):
+    if isinstance(locations, str):
+      locations = [locations]
+    for location in locations:
+      if os.path.isfile(location):
+        yield location
+        continue
+      for root, dirs, files in os.walk(location):
+        for name in fnmatch.filter(files, pattern):
+          yield os.path.join(root, name)
+        if not recursive:
+          break
+
+  def refresh(self, locations, context: udSDK.udContext, pattern="*.uds", recursive=True, save=True):
+    """
+    Updates the catalog with the models found in locations, a directory, file, or list of these.
+    Files are only loaded if they are not in the catalog or their modification time or size has changed; entries of
+    files that no longer exist are removed. Files failing to load are logged and skipped.
+    Returns a dictionary of the number of models added, updated, removed, unchanged and failed
+    """
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "failed": 0}
+    models = dict(self._byPath)
+    seen = set()
+    for path in self._find(locations, pattern, recursive):
+      key = self._key(path)
+      seen.add(key)
+      stat = os.stat(path)
+      existing = models.get(key)
+      if existing is not None and existing["mtime"] == stat.st_mtime_ns and existing["size"] == stat.st_size:
+        counts["unchanged"] += 1
+        continue
+      try:
+        pointcloud = udSDK.udPointCloud(path, context)
+        models[key] = self.record(path, pointcloud, stat)
+      except udSDK.UdException as e:
+        logger.warning(f"Failed to load {path}: {e}")
+        counts["failed"] += 1
+        continue
+      counts["updated" if existing is not None else "added"] += 1
+
+    for key in list(models):
+      if key not in seen and not os.path.exists(key):
+        del models[key]
+        counts["removed"] += 1
+
+    if counts["added"] or counts["updated"] or counts["removed"]:
+      self._build(list(models.values()))
+      if save:
+        self.save()
+    return counts
+
+  def __len__(self):
+    return len(self.models)
+
+  def __iter__(self):
+    return iter(self.models)
+
+  def __getitem__(self, path: str):
+    return self._byPath[self._key(path)]
+
+  def __contains__(self, path: str):
+    return self._key(path) in self._byPath
+
+  def _select(self, indices):
+    return [self.models[i] for i in indices]
+
+  def query_box(self, minimum, maximum):
+    """
+    returns the entries of the models whose bounds intersect the axis aligned box (minimum, maximum)
+    """
+    return self._select(self._tree.query(minimum, maximum))
+
+  def query_point(self, point):
+    """
+    returns the entries of the models whose bounds contain point
+    """
+    return self.query_box(point, point)
+
+  def query(self, geometry: udSDKGeometry.udGeometry):
+    """
+    returns the entries of the models whose bounds intersect the bounds of the udGeometry geometry. The bounds of
+    rotated boxes and spheres are conservative, so models near but outside these may be returned;
+    udPointCloud.has_points_in can be used to test the returned models exactly
+    """
+    bounds = geometry.bounds()
+    if bounds is None:
+      raise ValueError(f"{type(geometry).__name__} has no bounds to query the catalog with")
+    return self.query_box(*bounds)
+
+  def query_obb(self, position, size, yawPitchRoll=(0, 0, 0)):
+    """
+    returns the entries of the models intersecting the box centred on position with half size size, see query
+    """
+    centre = np.array(position, dtype=float)
+    halfSize = np.abs(np.array(size, dtype=float))
+    if any(yawPitchRoll):
+      halfSize = np.full(3, np.linalg.norm(halfSize))
+    return self.query_box(centre - halfSize, centre + halfSize)
+
+  def query_polygon(self, polygonXY, zRange=None):
+    """
+    returns the entries of the models whose XY footprints intersect the polygon, a list of XY vertices. zRange
+    optionally restricts the result to models overlapping the (minimum, maximum) Z range
+    """
+    polygon = np.asarray(polygonXY, dtype=float)[:, :2]
+    zMin, zMax = zRange if zRange is not None else (-np.inf, np.inf)
+    indices = self._tree.query([*polygon.min(axis=0), zMin], [*polygon.max(axis=0), zMax])
+    minimums, maximums = self._tree.levels[0]
+    hit = _boxes_intersect_polygon(minimums[indices], maximums[indices], polygon)
+    return self._select(indices[hit])
+
+  def paths(self, entries=None):
+    """
+    returns the paths of entries, by default all models of the catalog
+    """
+    return [entry["path"] for entry in (self.models if entries is None else entries)]
@@ -108,6 +108,13 @@ class udGeometry():
         ret.set_metadata_double(f"transform.rotation.{cs[i]}", self.yawPitchRoll[i])
     return ret
 
+  def bounds(self):
+    """
+    returns the (minimum, maximum) corners of an axis aligned box containing the geometry, or None if the geometry is
+    unbounded or its bounds are not known
+    """
+    return None
+
   @property
   def inverse(self):
     """
@@ -176,6 +183,10 @@ class udGeometrySphere(udGeometry):
     self.__radius = float(radius)
     self._set_geometry()
 
+  def bounds(self):
+    centre = np.array(self.__position, dtype=float)
+    return centre - self.__radius, centre + self.__radius
+
 
 class udGeometryOBB(udGeometry):
   """
@@ -241,6 +252,14 @@ class udGeometryOBB(udGeometry):
     self.__size = tuple([*size])
     self._set_geometry()
 
+  def bounds(self):
+    centre = np.array(self.__position, dtype=float)
+    halfSize = np.abs(np.array(self.__size, dtype=float))
+    if any(self.__yawPitchRoll):
+      # a rotated box is contained by the sphere through its corners
+      halfSize = np.full(3, np.linalg.norm(halfSize))
+    return centre - halfSize, centre + halfSize
+
 
 
 class udGeometryHalfSpace(udGeometry):
@@ -313,8 +332,22 @@ class udGeometryCSG(udGeometry):
     self._left = left
     self._right = right
     super(udGeometryCSG, self).__init__()
+    self._operation = operation
     self._udGeometry_InitCSG(self.pGeometry, left.pGeometry, right.pGeometry, ctypes.c_uint(operation))
 
+  def bounds(self):
+    left = self._left.bounds()
+    right = self._right.bounds()
+    if self._operation == udGeometryCSGOperation.udCSGO_Difference:
+      return left
+    if self._operation == udGeometryCSGOperation.udCSGO_Union:
+      if left is None or right is None:
+        return None
+      return np.minimum(left[0], right[0]), np.maximum(left[1], right[1])
+    if left is None or right is None:
+      return left if right is None else right
+    return np.maximum(left[0], right[0]), np.minimum(left[1], right[1])
+
   def as_project_node(self, parent=None):
     raise NotImplementedError
 
@@ -0,0 +1,741 @@
+import json
+import os
+import queue
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import udSDK
+import udSDKGeometry
+
+
+class udNpyColumnWriter:
+  """
+  Writes rows of a single column to a .npy file which grows in chunks of chunkRows rows.
+  Rows are written through a memory map of the file and the header is rewritten with the final row count on close,
+  after which the file can be read with np.load(path, mmap_mode='r')
+  """
+  _headerSize = 256  # fixed size of the .npy header, large enough for any shape this writer produces
+
+  def __init__(self, path: str, dtype, rowShape=(), chunkRows=1 << 20):
+    self.path = path
+    self.dtype = np.dtype(dtype)
+    self.rowShape = tuple(rowShape)
+    self.chunkRows = max(1, int(chunkRows))
+    self._count = 0
+    self._capacity = 0
+    self._map = None
+    with open(self.path, "wb") as f:
+      f.write(self._header(0))
+    self._grow(self.chunkRows)
+
+  def _header(self, rows):
+    header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                   "shape": (rows, *self.rowShape)})
+    headerLength = self._headerSize - 10  # magic string, version and header length
+    if len(header) + 1 > headerLength:
+      raise ValueError("column shape too large for the npy header")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", headerLength) + (header.ljust(headerLength - 1) + "\n").encode("latin1")
+
+  @property
+  def _rowBytes(self):
+    return self.dtype.itemsize * int(np.prod(self.rowShape, dtype=np.int64))
+
+  def _grow(self, capacity):
+    if self._map is not None:
+      self._map.flush()
+      self._map = None
+    with open(self.path, "r+b") as f:
+      f.truncate(self._headerSize + capacity * self._rowBytes)
+    self._capacity = capacity
+    self._map = np.memmap(self.path, self.dtype, "r+", offset=self._headerSize, shape=(capacity, *self.rowShape))
+
+  def append(self, rows):
+    """
+    Appends rows (an array of shape (n, *rowShape)) to the end of the column, growing the file as required
+    """
+    n = len(rows)
+    if self._count + n > self._capacity:
+      chunks = -(-(self._count + n) // self.chunkRows)
+      self._grow(chunks * self.chunkRows)
+    self._map[self._count:self._count + n] = rows
+    self._count += n
+
+  def close(self):
+    """
+    Truncates the file to the number of rows written and writes the final header
+    """
+    if self._map is None:
+      return
+    self._map.flush()
+    self._map = None
+    with open(self.path, "r+b") as f:
+      f.truncate(self._headerSize + self._count * self._rowBytes)
+      f.write(self._header(self._count))
+
+  def __len__(self):
+    return self._count
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+
+def _header_transform(header: udSDK.udPointCloudHeader):
+  """
+  returns the parts of the point cloud header describing the placement of the points in world space as a dictionary
+  """
+  return {
+    "scaledRange": header.scaledRange,
+    "unitMeterScale": header.unitMeterScale,
+    "convertedResolution": header.convertedResolution,
+    "totalLODLayers": header.totalLODLayers,
+    "storedMatrix": [*header.storedMatrix],
+    "baseOffset": [*header.baseOffset],
+    "pivot": [*header.pivot],
+    "boundingBoxCenter": [*header.boundingBoxCenter],
+    "boundingBoxExtents": [*header.boundingBoxExtents],
+  }
+
+
+def export_npy(query: udSDK.udQueryContext, directory: str, batchSize=1000000, chunkPoints=1 << 22,
+               bufferType=udSDK.udPointBufferF64):
+  """
+  Streams the results of query into a directory of memory mapped .npy files, one per column (positions and each
+  attribute of the point cloud), growing each file in chunks of chunkPoints points.
+  A manifest.json recording the point count, the file, dtype and shape of each column and the transform of the point
+  cloud header is written alongside the columns. Returns the manifest.
+  """
+  os.makedirs(directory, exist_ok=True)
+  header = query.pointcloud.header
+  columns = {"positions": (np.dtype(bufferType.dtype), (3,))}
+  for attr in header.attributes:
+    dtype = udSDK.udAttributeTypeInfo(attr.typeInfo).to_dtype()
+    columns[attr.name.decode('utf8')] = (dtype.base, dtype.shape)
+
+  writers = {}
+  manifestColumns = {}
+  try:
+    for name, (dtype, rowShape) in columns.items():
+      fileName = re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".npy"
+      writers[name] = udNpyColumnWriter(os.path.join(directory, fileName), dtype, rowShape, chunkPoints)
+      manifestColumns[name] = {"file": fileName, "dtype": np.lib.format.dtype_to_descr(dtype), "rowShape": [*rowShape]}
+
+    for positions, attributes in query.iter_batches(batchSize, bufferType=bufferType):
+      writers["positions"].append(positions)
+      for name in attributes.dtype.names:
+        writers[name].append(attributes[name])
+  finally:
+    for writer in writers.values():
+      writer.close()
+
+  manifest = {
+    "count": len(writers["positions"]),
+    "positionType": bufferType.dtype,
+    "columns": manifestColumns,
+    "header": _header_transform(header),
+  }
+  if bufferType is udSDK.udPointBufferI64:
+    scale, offset = udSDK.udPointBufferI64.quantization(header)
+    manifest["quantization"] = {"scale": scale, "offset": offset.tolist()}
+  with open(os.path.join(directory, "manifest.json"), "w") as f:
+    json.dump(manifest, f, indent=2)
+  return manifest
+
+
+def load_npy(directory: str, mmapMode="r"):
+  """
+  Opens a directory written by export_npy. Returns (manifest, columns) where columns maps each column name to its array,
+  memory mapped with mmapMode
+  """
+  with open(os.path.join(directory, "manifest.json")) as f:
+    manifest = json.load(f)
+  columns = {}
+  for name, column in manifest["columns"].items():
+    mode = mmapMode if manifest["count"] else None  # empty files cannot be memory mapped
+    columns[name] = np.load(os.path.join(directory, column["file"]), mmap_mode=mode)
+  return manifest, columns
+
+
+def _put(q: queue.Queue, item, cancelled: threading.Event):
+  """
+  puts item on q, waiting for space unless cancelled is set. Returns False if the put was cancelled
+  """
+  while not cancelled.is_set():
+    try:
+      q.put(item, timeout=0.1)
+      return True
+    except queue.Full:
+      pass
+  return False
+
+
+class udParallelQuery:
+  """
+  Executes a query of a udPointCloud across a pool of worker threads.
+  The region of the filter is split into a grid of tiles; each worker thread queries tiles using its own
+  udQueryContext and buffers on the shared point cloud. Native query execution releases the GIL so tiles are traversed
+  concurrently.
+  Each point is given to exactly one tile: tiles are half open boxes [minimum, maximum) on the faces they share with
+  other tiles, so points lying on a shared face, which the native query returns for both tiles, are only kept by the
+  tile above the face.
+  """
+  def __init__(self, context: udSDK.udContext, pointcloud: udSDK.udPointCloud, filter=None, tiles=(4, 4, 1),
+               workers=None, batchSize=100000, ringSize=1, bufferType=udSDK.udPointBufferF64, queueSize=4,
+               pool: udSDK.udPointBufferPool = None):
+    """
+    filter: the udGeometry to query, None queries the whole point cloud
+    tiles: the number of divisions of the region along each axis
+    workers: the number of worker threads, defaults to the number of CPUs
+    queueSize: the number of batches each tile may have waiting to be consumed before its worker blocks
+    pool: the udPointBufferPool worker buffers are acquired from, by default each udParallelQuery keeps its own pool so
+    repeated runs reuse the buffers of the previous run
+    """
+    self.context = context
+    self.pointcloud = pointcloud
+    self.filter = filter
+    self.tiles = tuple(tiles)
+    self.workers = workers or os.cpu_count()
+    self.batchSize = batchSize
+    self.ringSize = ringSize
+    self.bufferType = bufferType
+    self.queueSize = queueSize
+    if pool is None:
+      pool = udSDK.udPointBufferPool(maxIdle=self.workers * max(1, ringSize))
+    self.pool = pool
+    self.tileBounds = []
+    self.tileFilters = self._make_tiles()
+
+  def _make_tiles(self):
+    """
+    creates the geometry filters of each tile: boxes dividing the bounds of the query intersected with the filter.
+    The (lower, upper) bounds of the points kept by each tile are stored in tileBounds; faces on the outside of the
+    region are unbounded so no points returned by the outermost tiles are discarded
+    """
+    minimum, maximum = self.pointcloud.header.world_bounds()
+    clip = self.filter
+    if isinstance(self.filter, udSDKGeometry.udGeometryOBB) and not any(self.filter.yawPitchRoll):
+      # unrotated boxes are tiled directly rather than with CSG intersections
+      centre = np.array(self.filter.position, dtype=float)
+      halfSize = np.array(self.filter.size, dtype=float)
+      minimum = np.maximum(minimum, centre - halfSize)
+      maximum = np.minimum(maximum, centre + halfSize)
+      clip = None
+    self.tileBounds = []
+    if np.any(maximum < minimum):
+      return []
+
+    tiles = np.array(self.tiles)
+    tileHalfSize = (maximum - minimum) / tiles / 2
+    ret = []
+    for index in np.ndindex(*self.tiles):
+      index = np.array(index)
+      centre = minimum + (2 * index + 1) * tileHalfSize
+      tile = udSDKGeometry.udGeometryOBB(position=centre.tolist(), size=tileHalfSize.tolist())
+      if clip is not None:
+        tile = tile.intersection(clip)
+      ret.append(tile)
+      lower = np.where(index > 0, centre - tileHalfSize, -np.inf)
+      upper = np.where(index < tiles - 1, centre + tileHalfSize, np.inf)
+      self.tileBounds.append((lower, upper))
+    return ret
+
+  def _tile_batches(self, tileIndex, states: dict):
+    """
+    returns the batch iterator of a tile using the udQueryContext and buffers of the calling worker thread
+    """
+    tile = self.tileFilters[tileIndex]
+    state = states.get(threading.get_ident())
+    if state is None:
+      query = udSDK.udQueryContext(self.context, self.pointcloud, tile)
+      buffers = [self.pool.acquire(self.batchSize, self.pointcloud.header.attributes, self.bufferType)
+                 for i in range(max(1, self.ringSize))]
+      states[threading.get_ident()] = (query, buffers)
+    else:
+      query, buffers = state
+      query.geometryFilter = tile
+    return self._partition(tileIndex, query.iter_batches(buffers=buffers))
+
+  def _partition(self, tileIndex, batches):
+    """
+    filters the batches of a tile to the points within its half open bounds, so points on faces shared with other
+    tiles are only returned once
+    """
+    lower, upper = self.tileBounds[tileIndex]
+    if issubclass(self.bufferType, udSDK.udPointBufferI64):
+      # bounds are in world space, integer buffers hold quantized positions:
+      scale, offset = udSDK.udPointBufferI64.quantization(self.pointcloud.header)
+      lower = (lower - offset) / scale
+      upper = (upper - offset) / scale
+    for positions, attributes in batches:
+      inside = np.all((positions >= lower) & (positions < upper), axis=1)
+      if inside.all():
+        yield positions, attributes
+      elif inside.any():
+        yield positions[inside], attributes[inside]
+
+  def _release(self, states: dict):
+    """
+    returns the buffers of each worker thread to the pool
+    """
+    for query, buffers in states.values():
+      for buff in buffers:
+        self.pool.release(buff)
+    states.clear()
+
+  def _run_tile(self, tileIndex, out: queue.Queue, cancelled: threading.Event, states: dict):
+    """
+    queries a single tile on a worker thread, putting copies of each batch followed by None on out
+    """
+    if cancelled.is_set():
+      return
+    try:
+      for positions, attributes in self._tile_batches(tileIndex, states):
+        if not _put(out, (tileIndex, (positions.copy(), attributes.copy())), cancelled):
+          return
+      _put(out, (tileIndex, None), cancelled)
+    except Exception as e:
+      _put(out, (tileIndex, e), cancelled)
+
+  def iter_batches(self, ordered=True):
+    """
+    Generator yielding (positions, attributes) arrays for each batch of points matching the query.
+    If ordered, all batches of a tile are yielded before those of the next tile, otherwise batches are yielded in the
+    order they are read.
+    """
+    tileCount = len(self.tileFilters)
+    cancelled = threading.Event()
+    states = {}
+    if ordered:
+      queues = [queue.Queue(self.queueSize) for i in range(tileCount)]
+    else:
+      queues = [queue.Queue(self.queueSize * self.workers)] * tileCount
+
+    executor = ThreadPoolExecutor(self.workers)
+    try:
+      for i in range(tileCount):
+        executor.submit(self._run_tile, i, queues[i], cancelled, states)
+      remaining = tileCount
+      current = 0
+      while remaining:
+        tileIndex, item = queues[current].get()
+        if isinstance(item, Exception):
+          raise item
+        if item is None:
+          remaining -= 1
+          if ordered:
+            current += 1
+          continue
+        yield item
+    finally:
+      cancelled.set()
+      executor.shutdown(wait=True, cancel_futures=True)
+      self._release(states)
+
+  def reduce(self, reducerFactory):
+    """
+    Reduces the points matching the query on the worker threads: each tile is passed batch by batch to
+    reducer.update(positions, attributes) of a reducer created with reducerFactory(), and the reducers of all tiles are
+    combined with merge. Returns the merged reducer. e.g.
+    stats = parallelQuery.reduce(lambda: udQueryStatistics(pointcloud.header))
+    """
+    states = {}
+
+    def reduce_tile(tileIndex):
+      reducer = reducerFactory()
+      for positions, attributes in self._tile_batches(tileIndex, states):
+        reducer.update(positions, attributes)
+      return reducer
+
+    ret = reducerFactory()
+    try:
+      with ThreadPoolExecutor(self.workers) as executor:
+        for reducer in executor.map(reduce_tile, range(len(self.tileFilters))):
+          ret.merge(reducer)
+    finally:
+      self._release(states)
+    return ret
+
+  def count(self):
+    """
+    returns the number of points matching the query, counted by the tiles in parallel
+    """
+    return self.reduce(_udPointCounter).count
+
+  def check_tiling(self):
+    """
+    Verifies that the tiles partition the query: the sum of the points counted by each tile must equal the number of
+    points returned by the query executed serially. Returns the count, raises ValueError if they differ
+    """
+    tileCount = self.count()
+    query = udSDK.udQueryContext(self.context, self.pointcloud, self.filter)
+    serialCount = query.reduce(_udPointCounter(), self.batchSize, self.bufferType).count
+    if tileCount != serialCount:
+      raise ValueError(f"Tiles returned {tileCount} points but the serial query returned {serialCount}")
+    return tileCount
+
+
+class _udPointCounter:
+  """
+  reducer counting the points of a query
+  """
+  def __init__(self):
+    self.count = 0
+
+  def update(self, positions, attributes):
+    self.count += len(positions)
+
+  def merge(self, other):
+    self.count += other.count
+    return self
+
+
+class udAttributeStatistics:
+  """
+  Single pass accumulator of the count, minimum, maximum, mean and variance of a column of values, and optionally
+  a fixed bin histogram of each component. Accumulators with the same histogram ranges can be merged, allowing
+  statistics of separately processed parts of a query to be combined.
+  """
+  def __init__(self, components=1, bins=None, ranges=None):
+    """
+    components: the number of values per point (e.g. 3 for positions)
+    bins: the number of histogram bins per component, None disables the histogram
+    ranges: (minimum, maximum) of the histogram, either one pair for all components or a pair per component
+    """
+    self.components = components
+    self.count = 0
+    self._minimum = np.full(components, np.inf)
+    self._maximum = np.full(components, -np.inf)
+    self._mean = np.zeros(components)
+    self._m2 = np.zeros(components)
+    self.histogram = None
+    self.binEdges = None
+    if bins is not None and ranges is not None:
+      ranges = np.broadcast_to(np.asarray(ranges, dtype=np.float64), (components, 2))
+      self.histogram = np.zeros((components, bins), dtype=np.int64)
+      self.binEdges = np.stack([np.linspace(lo, hi, bins + 1) for lo, hi in ranges])
+
+  def _output(self, value):
+    return value[0] if self.components == 1 else value
+
+  @property
+  def minimum(self):
+    return self._output(self._minimum)
+
+  @property
+  def maximum(self):
+    return self._output(self._maximum)
+
+  @property
+  def mean(self):
+    return self._output(self._mean)
+
+  @property
+  def variance(self):
+    return self._output(self._m2 / self.count if self.count else np.full(self.components, np.nan))
+
+  @property
+  def std(self):
+    return np.sqrt(self.variance)
+
+  def _combine(self, count, minimum, maximum, mean, m2):
+    """
+    merges the moments of another set of values into this accumulator (Chan et al. parallel variance)
+    """
+    total = self.count + count
+    delta = mean - self._mean
+    self._mean = self._mean + delta * (count / total)
+    self._m2 = self._m2 + m2 + delta ** 2 * (self.count * count / total)
+    self._minimum = np.minimum(self._minimum, minimum)
+    self._maximum = np.maximum(self._maximum, maximum)
+    self.count = total
+
+  def update(self, values):
+    """
+    adds a batch of values of shape (n,) or (n, components) to the statistics
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1, self.components)
+    if len(values) == 0:
+      return
+    mean = values.mean(axis=0)
+    self._combine(len(values), values.min(axis=0), values.max(axis=0), mean, ((values - mean) ** 2).sum(axis=0))
+    if self.histogram is not None:
+      for c in range(self.components):
+        edges = self.binEdges[c]
+        column = np.clip(values[:, c], edges[0], edges[-1])
+        self.histogram[c] += np.histogram(column, bins=edges)[0]
+
+  def merge(self, other):
+    """
+    merges the statistics accumulated by other into this accumulator
+    """
+    if other.count:
+      self._combine(other.count, other._minimum, other._maximum, other._mean, other._m2)
+    if self.histogram is not None:
+      if other.histogram is None or not np.array_equal(self.binEdges, other.binEdges):
+        raise ValueError("Cannot merge statistics with different histogram ranges")
+      self.histogram += other.histogram
+    return self
+
+  def percentile(self, q, component=0):
+    """
+    estimates the qth percentile (0-100) of a component by interpolating within its histogram
+    """
+    if self.histogram is None:
+      raise ValueError("Percentiles require a histogram")
+    counts = self.histogram[component]
+    edges = self.binEdges[component]
+    if not counts.sum():
+      return np.nan
+    target = q / 100 * counts.sum()
+    cumulative = np.cumsum(counts)
+    binIndex = min(int(np.searchsorted(cumulative, target)), len(counts) - 1)
+    below = cumulative[binIndex] - counts[binIndex]
+    fraction = (target - below) / counts[binIndex] if counts[binIndex] else 0
+    return edges[binIndex] + fraction * (edges[binIndex + 1] - edges[binIndex])
+
+
+class udQueryStatistics:
+  """
+  Reducer accumulating statistics of the points returned by a query one batch at a time: the point count,
+  udAttributeStatistics of the positions and of each attribute of the point cloud.
+  Colour attributes are split into their (r, g, b, a) channels; encoded normals are not summarised.
+  Histograms of positions cover the bounds of the point cloud, so Z percentiles can be estimated with z_percentile.
+  Quantized positions (from udPointBufferI64 batches) are converted to world space before being summarised.
+  Integer attributes are histogrammed over the range of their type, other attributes only if a range is given in
+  ranges.
+  """
+  def __init__(self, header: udSDK.udPointCloudHeader, bins=256, ranges=None):
+    """
+    header: the header of the point cloud being queried
+    bins: the number of histogram bins of each component
+    ranges: optional dictionary mapping attribute names to the (minimum, maximum) range of their histogram
+    """
+    ranges = ranges or {}
+    minimum, maximum = header.world_bounds()
+    self._quantization = udSDK.udPointBufferI64.quantization(header)
+    self.positions = udAttributeStatistics(3, bins, np.stack([minimum, maximum], axis=1))
+    self.attributes = {}
+    self._colourAttributes = set()
+    for attr in header.attributes:
+      name = attr.name.decode('utf8')
+      typeInfo = attr.typeInfo
+      dtype = udSDK.udAttributeTypeInfo(typeInfo).to_dtype()
+      components = int(np.prod(dtype.shape, dtype=np.int64))
+      if typeInfo & udSDK.udAttributeTypeInfo.udATI_Normal:
+        continue
+      if typeInfo & udSDK.udAttributeTypeInfo.udATI_Color:
+        self._colourAttributes.add(name)
+        self.attributes[name] = udAttributeStatistics(4, bins, ranges.get(name, (0, 255)))
+        continue
+      attributeRange = ranges.get(name)
+      if attributeRange is None and dtype.base.kind in "iu":
+        attributeRange = (np.iinfo(dtype.base).min, np.iinfo(dtype.base).max)
+      self.attributes[name] = udAttributeStatistics(components, bins, attributeRange)
+
+  @property
+  def count(self):
+    """
+    The number of points summarised
+    """
+    return self.positions.count
+
+  def update(self, positions, attributes):
+    """
+    adds a batch of points (as yielded by udQueryContext.iter_batches) to the statistics
+    """
+    if positions.dtype.kind in "iu":
+      scale, offset = self._quantization
+      positions = positions * scale + offset
+    self.positions.update(positions)
+    for name, statistics in self.attributes.items():
+      values = attributes[name]
+      if name in self._colourAttributes:
+        values = np.ascontiguousarray(values, dtype=np.uint32).view(np.uint8).reshape(-1, 4)[:, [2, 1, 0, 3]]
+      statistics.update(values)
+
+  def merge(self, other):
+    """
+    merges the statistics accumulated by other (e.g. from another tile of the query) into these statistics
+    """
+    self.positions.merge(other.positions)
+    for name, statistics in self.attributes.items():
+      statistics.merge(other.attributes[name])
+    return self
+
+  def z_percentile(self, q):
+    """
+    estimates the qth percentile (0-100) of the Z coordinate of the points
+    """
+    return self.positions.percentile(q, component=2)
+
+
+class udVoxelGridDecimator:
+  """
+  Streaming voxel grid downsampling of query results, keeping a single point for each occupied cubic cell of cellSize.
+  Without blend the first point read in each cell is kept. With blend positions are averaged and each attribute is
+  combined according to the udAttributeBlendType of its descriptor: udABT_Mean attributes are averaged (colours per
+  channel) while others keep the value of the first point.
+  Cells are indexed by a hash of their integer coordinates, so memory use grows with the number of occupied cells rather
+  than the number of points read. Use as a reducer with udQueryContext.reduce or udParallelQuery.reduce and read the
+  decimated points with result(). Quantized positions (from udPointBufferI64 batches) are converted to world space, so
+  the decimated positions are always float64 world coordinates.
+  """
+  _axisBits = 21  # bits of the cell key used by each axis
+
+  def __init__(self, header: udSDK.udPointCloudHeader, cellSize: float, blend=False, origin=None):
+    """
+    header: the header of the point cloud being queried
+    cellSize: the length of the sides of each cell in world units
+    origin: the corner of the grid, defaults to the minimum of the bounds of the point cloud
+    """
+    self.cellSize = float(cellSize)
+    self.blend = blend
+    self.origin = np.array(header.world_bounds()[0] if origin is None else origin, dtype=np.float64)
+    self._quantization = udSDK.udPointBufferI64.quantization(header)
+    self._meanAttributes = {}  # name -> is colour, for attributes averaged when blending
+    for attr in header.attributes:
+      if attr.blendType == udSDK.udAttributeBlendType.udABT_Mean and not attr.typeInfo & udSDK.udAttributeTypeInfo.udATI_Normal:
+        self._meanAttributes[attr.name.decode('utf8')] = bool(attr.typeInfo & udSDK.udAttributeTypeInfo.udATI_Color)
+
+    self.count = 0
+    self._keys = np.zeros(0, dtype=np.int64)  # sorted cell keys
+    self._slots = np.zeros(0, dtype=np.int64)  # the slot of the cell with the key at the same index in _keys
+    self._positions = None
+    self._attributes = None
+    self._counts = None
+    self._positionSums = None
+    self._attributeSums = {}
+
+  def _cell_keys(self, positions):
+    cells = np.floor((np.asarray(positions, dtype=np.float64) - self.origin) / self.cellSize).astype(np.int64)
+    cells += 1 << (self._axisBits - 1)
+    if np.any(cells < 0) or np.any(cells >= 1 << self._axisBits):
+      raise ValueError("Points lie too far from the grid origin for the cell size")
+    return (cells[:, 0] << (2 * self._axisBits)) | (cells[:, 1] << self._axisBits) | cells[:, 2]
+
+  @staticmethod
+  def _mean_values(values, isColour):
+    values = np.asarray(values)
+    if isColour:
+      return np.ascontiguousarray(values, dtype=np.uint32).view(np.uint8).reshape(-1, 4).astype(np.float64)
+    return values.reshape(len(values), -1).astype(np.float64)
+
+  def _reserve(self, capacity, attributeDtype):
+    """
+    grows the per cell storage to hold at least capacity cells
+    """
+    if self._positions is None:
+      self._positions = np.zeros((0, 3))
+      self._attributes = np.zeros(0, dtype=attributeDtype)
+      self._counts = np.zeros(0, dtype=np.int64)
+      self._positionSums = np.zeros((0, 3))
+    if capacity <= len(self._counts):
+      return
+    capacity = max(capacity, 2 * len(self._counts), 1024)
+
+    def grown(array):
+      ret = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+      ret[:len(array)] = array
+      return ret
+
+    self._positions = grown(self._positions)
+    self._attributes = grown(self._attributes)
+    self._counts = grown(self._counts)
+    self._positionSums = grown(self._positionSums)
+    for name in self._attributeSums:
+      self._attributeSums[name] = grown(self._attributeSums[name])
+
+  def _accumulate(self, keys, positions, attributes, counts, positionSums, attributeSums):
+    """
+    adds cells with unique keys to the grid. positions and attributes are the first point of each cell, counts,
+    positionSums and attributeSums the number of points in each cell and the sums used for blending
+    """
+    self._reserve(self.count + len(keys), attributes.dtype)
+    index = np.searchsorted(self._keys, keys)
+    found = index < len(self._keys)
+    found[found] = self._keys[index[found]] == keys[found]
+    slots = np.empty(len(keys), dtype=np.int64)
+    slots[found] = self._slots[index[found]]
+
+    isNew = ~found
+    newSlots = np.arange(self.count, self.count + int(isNew.sum()))
+    slots[isNew] = newSlots
+    self._keys = np.insert(self._keys, index[isNew], keys[isNew])
+    self._slots = np.insert(self._slots, index[isNew], newSlots)
+    self._positions[newSlots] = positions[isNew]
+    self._attributes[newSlots] = attributes[isNew]
+    self.count += len(newSlots)
+
+    if self.blend:
+      self._counts[slots] += counts
+      self._positionSums[slots] += positionSums
+      for name, sums in attributeSums.items():
+        if name not in self._attributeSums:
+          self._attributeSums[name] = np.zeros((len(self._counts), sums.shape[1]))
+        self._attributeSums[name][slots] += sums
+
+  def update(self, positions, attributes):
+    """
+    adds a batch of points (as yielded by udQueryContext.iter_batches) to the grid
+    """
+    if len(positions) == 0:
+      return
+    if positions.dtype.kind in "iu":
+      scale, offset = self._quantization
+      positions = positions * scale + offset
+    keys, first, inverse = np.unique(self._cell_keys(positions), return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = positionSums = None
+    attributeSums = {}
+    if self.blend:
+      counts = np.bincount(inverse, minlength=len(keys))
+      positionSums = np.stack([np.bincount(inverse, positions[:, c], len(keys)) for c in range(3)], axis=1)
+      for name, isColour in self._meanAttributes.items():
+        values = self._mean_values(attributes[name], isColour)
+        attributeSums[name] = np.stack([np.bincount(inverse, values[:, c], len(keys)) for c in range(values.shape[1])],
+                                       axis=1)
+    self._accumulate(keys, np.asarray(positions)[first], np.asarray(attributes)[first], counts, positionSums,
+                     attributeSums)
+
+  def merge(self, other):
+    """
+    merges the cells of another decimator with the same grid (e.g. from another tile of the query) into this grid
+    """
+    if other.count:
+      slots = other._slots
+      attributeSums = {name: sums[slots] for name, sums in other._attributeSums.items()}
+      counts = other._counts[slots] if self.blend else None
+      positionSums = other._positionSums[slots] if self.blend else None
+      self._accumulate(other._keys, other._positions[slots], other._attributes[slots], counts, positionSums,
+                       attributeSums)
+    return self
+
+  def result(self):
+    """
+    returns (positions, attributes) of the decimated points, one per occupied cell
+    """
+    if self._positions is None:
+      return np.zeros((0, 3)), None
+    n = self.count
+    attributes = self._attributes[:n].copy()
+    if not self.blend:
+      return self._positions[:n].copy(), attributes
+
+    counts = self._counts[:n, np.newaxis]
+    positions = self._positionSums[:n] / counts
+    for name, sums in self._attributeSums.items():
+      mean = sums[:n] / counts
+      if self._meanAttributes[name]:
+        attributes[name] = np.rint(mean).astype(np.uint8).view(np.uint32).reshape(-1)
+        continue
+      column = attributes[name]
+      if column.dtype.base.kind in "iu":
+        mean = np.rint(mean)
+      column[...] = mean.reshape(column.shape)
+    return positions, attributes
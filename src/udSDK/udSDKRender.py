@@ -0,0 +1,362 @@
+import ctypes
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import numpy as np
+
+import udSDK
+
+
+class udFrameWriter:
+  """
+  Writes rendered frames to disk on a pool of worker threads.
+  submit takes a snapshot of the colour and/or depth buffers of a udRenderTarget or udRenderBuffer, which the renderer is
+  then free to overwrite, and queues it to be encoded and written by a worker. The queue holds at most queueSize frames:
+  when it is full submit waits for space (backpressure), or drops the frame if block is False.
+  Frames are written as PNG images or raw .npy arrays, numbered in submission order when no path is given.
+  """
+  formats = ("png", "npy")
+
+  def __init__(self, directory=".", format="png", pattern="frame_{index:06d}", workers=2, queueSize=8, block=True):
+    """
+    directory: the directory numbered frames are written to
+    format: "png" to write colour as PNG images or "npy" to write the raw arrays. Depth is always written as .npy
+    pattern: the name of numbered frames, formatted with the index of the frame
+    workers: the number of threads encoding frames
+    queueSize: the number of frames that may be waiting to be written
+    block: whether submit waits for space in the queue rather than dropping the frame
+    """
+    if format not in self.formats:
+      raise ValueError(f"Unsupported frame format {format}")
+    self.directory = directory
+    self.format = format
+    self.pattern = pattern
+    self.block = block
+    self.submitted = 0
+    self.written = 0
+    self.dropped = 0
+    self._errors = []
+    self._lock = threading.Lock()
+    self._free = {}
+    self._queue = queue.Queue(queueSize)
+    self._workers = [threading.Thread(target=self._run, daemon=True) for i in range(max(1, workers))]
+    for worker in self._workers:
+      worker.start()
+
+  def _array(self, shape, dtype):
+    """
+    returns a snapshot array of shape and dtype, reusing the array of a frame that has been written if possible
+    """
+    with self._lock:
+      free = self._free.get((shape, dtype))
+      if free:
+        return free.pop()
+    return np.empty(shape, dtype)
+
+  def _recycle(self, array):
+    with self._lock:
+      self._free.setdefault((array.shape, array.dtype.str), []).append(array)
+
+  def submit(self, source, path=None, colour=True, depth=False):
+    """
+    Snapshots the buffers of source, a udRenderTarget or udRenderBuffer, and queues them to be written.
+    path is the file to write without extension, by default the next numbered frame in directory. The depth buffer is
+    written to path + "_depth.npy" if depth is set.
+    Returns the path the frame will be written to, or None if it was dropped
+    """
+    with self._lock:
+      index = self.submitted
+      self.submitted += 1
+    if path is None:
+      path = os.path.join(self.directory, self.pattern.format(index=index))
+    frame = {}
+    if colour:
+      colourArray = self._array((source.height, source.width, 4), np.dtype(np.uint8).str)
+      frame["colour"] = source.colour_array("RGBA", out=colourArray)
+    if depth:
+      depthArray = self._array((source.height, source.width), np.dtype(np.float32).str)
+      frame["depth"] = source.depth_array(out=depthArray)
+
+    try:
+      self._queue.put((path, frame), block=self.block)
+    except queue.Full:
+      with self._lock:
+        self.dropped += 1
+      for array in frame.values():
+        self._recycle(array)
+      return None
+    return path
+
+  def _write(self, path, frame):
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    if "colour" in frame:
+      if self.format == "png":
+        from PIL import Image
+        Image.fromarray(frame["colour"], "RGBA").save(path + ".png")
+      else:
+        np.save(path + ".npy", frame["colour"])
+    if "depth" in frame:
+      np.save(path + "_depth.npy", frame["depth"])
+
+  def _run(self):
+    while True:
+      item = self._queue.get()
+      try:
+        if item is None:
+          return
+        path, frame = item
+        self._write(path, frame)
+        with self._lock:
+          self.written += 1
+        for array in frame.values():
+          self._recycle(array)
+      except Exception as e:
+        with self._lock:
+          self._errors.append(e)
+      finally:
+        self._queue.task_done()
+
+  def _raise_errors(self):
+    with self._lock:
+      errors, self._errors = self._errors, []
+    if errors:
+      raise errors[0]
+
+  def flush(self):
+    """
+    waits until every queued frame has been written, raising the first error encountered by a worker
+    """
+    self._queue.join()
+    self._raise_errors()
+
+  def close(self):
+    """
+    writes the remaining frames and stops the workers
+    """
+    if self._workers:
+      for worker in self._workers:
+        self._queue.put(None)
+      for worker in self._workers:
+        worker.join()
+      self._workers = []
+    self._raise_errors()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+
+class udBatchRenderer:
+  """
+  Renders the same scene offscreen from many camera poses.
+  Work is spread over a pool of workers each owning a udRenderContext and udRenderTarget, rendering on their own thread;
+  the native render releases the GIL so poses are rendered concurrently. The stacked result arrays are kept and reused
+  by subsequent batches of the same size, so they are overwritten by the next call to render or render_iter.
+  """
+  def __init__(self, context: udSDK.udContext, width=640, height=480, workers=2, colour=False, depth=True, passes=1,
+               renderSettings: udSDK.udRenderSettings = None, projectionMatrix=None):
+    """
+    context: the udContext to create the render contexts of the workers with
+    width, height: the size of each render in pixels
+    workers: the number of poses rendered concurrently
+    colour, depth: which buffers are returned for each pose
+    passes: the number of times each pose is rendered before its buffers are read, allowing streaming to refine the
+      render when renderSettings does not block on streaming
+    renderSettings: the udRenderSettings of each render, copied to each worker
+    projectionMatrix: the 4x4 projection of poses not given a projection of their own, by default that of udRenderTarget
+    """
+    if not (colour or depth):
+      raise ValueError("At least one of colour and depth must be returned")
+    self.context = context
+    self.width = width
+    self.height = height
+    self.colour = colour
+    self.depth = depth
+    self.passes = max(1, passes)
+    self.projectionMatrix = projectionMatrix
+    self._depths = None
+    self._colours = None
+    self._workers = queue.Queue()
+    for i in range(max(1, workers)):
+      self._workers.put(self._create_worker(renderSettings))
+    self._executor = ThreadPoolExecutor(max(1, workers))
+
+  def _create_worker(self, renderSettings):
+    renderContext = udSDK.udRenderContext(self.context)
+    renderTarget = udSDK.udRenderTarget(self.width, self.height, context=self.context, renderContext=renderContext)
+    if renderSettings is not None:
+      renderTarget.renderSettings = renderSettings.copy()
+    return renderContext, renderTarget
+
+  @staticmethod
+  def _matrices(matrices, count=None):
+    """
+    returns matrices, a sequence of 4x4 or length 16 matrices, as a contiguous (N, 16) float64 array
+    """
+    ret = np.ascontiguousarray(matrices, dtype=np.float64).reshape(-1, 16)
+    if count is not None and len(ret) != count:
+      raise ValueError(f"Expected {count} matrices, got {len(ret)}")
+    return ret
+
+  def _outputs(self, count):
+    """
+    returns the stacked depth and colour arrays of a batch of count poses, reusing those of the previous batch if they
+    are the same size
+    """
+    if self.depth and (self._depths is None or len(self._depths) != count):
+      self._depths = np.empty((count, self.height, self.width), dtype=np.float32)
+    if self.colour and (self._colours is None or len(self._colours) != count):
+      self._colours = np.empty((count, self.height, self.width, 4), dtype=np.uint8)
+    return self._depths if self.depth else None, self._colours if self.colour else None
+
+  def _render_pose(self, index, renderInstances, cameraMatrix, projectionMatrix, depths, colours):
+    renderContext, renderTarget = self._workers.get()
+    try:
+      if projectionMatrix is not None:
+        renderTarget.projectionMatrix = projectionMatrix
+      renderTarget.cameraMatrix = cameraMatrix
+      for i in range(self.passes):
+        renderContext.render(renderTarget, renderInstances)
+      if depths is not None:
+        renderTarget.depth_array(out=depths[index])
+      if colours is not None:
+        renderTarget.colour_array("RGBA", out=colours[index])
+    finally:
+      self._workers.put((renderContext, renderTarget))
+    return index
+
+  def render_iter(self, renderInstances, cameraMatrices, projectionMatrices=None):
+    """
+    Renders renderInstances, a list of udRenderInstance, from each of cameraMatrices, an (N, 4, 4) or (N, 16) array of
+    camera matrices. projectionMatrices is an optional array of the same shape giving the projection of each pose.
+    Yields (index, depth, colour) for each pose as its render completes, in completion order. depth is a
+    (height, width) float32 array and colour a (height, width, 4) RGBA uint8 array, or None if not requested; both are
+    rows of the stacked arrays returned by render
+    """
+    cameraMatrices = self._matrices(cameraMatrices)
+    count = len(cameraMatrices)
+    if projectionMatrices is not None:
+      projectionMatrices = self._matrices(projectionMatrices, count)
+    elif self.projectionMatrix is not None:
+      projectionMatrices = self._matrices([self.projectionMatrix] * count)
+    # converted once so the workers share the instances:
+    if isinstance(renderInstances, udSDK.udRenderInstanceList):
+      renderInstances = renderInstances.sync()
+    elif isinstance(renderInstances, list):
+      renderInstances = udSDK.udRenderInstance.array_of(renderInstances)
+    depths, colours = self._outputs(count)
+
+    futures = [
+      self._executor.submit(self._render_pose, i, renderInstances, cameraMatrices[i],
+                            None if projectionMatrices is None else projectionMatrices[i], depths, colours)
+      for i in range(count)
+    ]
+    try:
+      for future in as_completed(futures):
+        index = future.result()
+        yield index, None if depths is None else depths[index], None if colours is None else colours[index]
+    finally:
+      for future in futures:
+        future.cancel()
+      wait(futures)
+
+  def render(self, renderInstances, cameraMatrices, projectionMatrices=None):
+    """
+    Renders renderInstances from each of cameraMatrices, see render_iter.
+    Returns (depths, colours): an (N, height, width) float32 array and an (N, height, width, 4) RGBA uint8 array, or
+    None for a buffer that is not requested
+    """
+    for result in self.render_iter(renderInstances, cameraMatrices, projectionMatrices):
+      pass
+    return self._outputs(len(self._matrices(cameraMatrices)))
+
+  def close(self):
+    """
+    stops the worker threads
+    """
+    self._executor.shutdown()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_val, exc_tb):
+    self.close()
+
+
+# the signs of the corners of a unit box about its centre:
+_boxCorners = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=float)
+
+
+def outside_frustum(centres, extents, matrices, viewProjection, depthPlanes=True):
+  """
+  Conservatively tests boxes against a view frustum.
+  centres and extents are the (N, 3) centres and half sizes of boxes which are transformed by matrices, (N, 4, 4)
+  row-major udRenderInstance style matrices, and viewProjection, the 4x4 product of the view and projection matrices.
+  Returns an (N,) boolean array which is True for boxes entirely outside one of the planes of the frustum; boxes
+  crossing the corners of the frustum may not be detected. The near and far planes are only tested if depthPlanes is set
+  """
+  centres = np.asarray(centres, dtype=float).reshape(-1, 3)
+  corners = centres[:, None, :] + np.asarray(extents, dtype=float).reshape(-1, 1, 3) * _boxCorners
+  corners = np.concatenate([corners, np.ones((len(centres), 8, 1))], axis=2)
+  transforms = np.asarray(matrices, dtype=float).reshape(-1, 4, 4) @ np.asarray(viewProjection, dtype=float).reshape(4, 4)
+  clip = corners @ transforms
+  w = clip[..., 3:]
+  # corners on the inside of each plane have -w <= x, y, z <= w:
+  inside = np.concatenate([w + clip[..., :3], w - clip[..., :3]], axis=2)
+  if not depthPlanes:
+    inside = inside[..., [0, 1, 3, 4]]
+  return np.any(np.all(inside < 0, axis=1), axis=1)
+
+
+def cull_instances(renderTarget: udSDK.udRenderTarget, renderInstances, depthPlanes=True):
+  """
+  Sets skipRender on each of renderInstances whose model bounds lie outside the view frustum of renderTarget, and
+  clears it on the others, so the renderer does not traverse models which cannot be seen. renderInstances is a list or
+  udRenderInstanceList of udRenderInstance or a udRenderInstanceArray. All instances are tested at once from the
+  bounding boxes in the headers of their models; the test is conservative, so every culled instance is off screen.
+  Instances without a model are not culled.
+  depthPlanes selects whether instances in front of the near or beyond the far plane are culled; it should be cleared
+  when rendering with logarithmic depth.
+  Returns the number of instances culled
+  """
+  if isinstance(renderInstances, udSDK.udRenderInstanceArray):
+    instances = renderInstances.instances
+    matrices = renderInstances.matrices
+  elif isinstance(renderInstances, udSDK.udRenderInstanceList):
+    instances = list(renderInstances)
+    matrices = renderInstances.matrices
+  else:
+    instances = list(renderInstances)
+    for instance in instances:
+      instance._refresh()
+    matrices = np.array([instance.matrix[:] for instance in instances], dtype=float).reshape(-1, 4, 4)
+  if not instances:
+    return 0
+  # instances without models (such as the elements of a ctypes array) have no bounds and are never culled:
+  models = [getattr(instance, "model", None) for instance in instances]
+  candidates = [i for i, model in enumerate(models) if model is not None]
+  culled = np.zeros(len(instances), dtype=bool)
+  if candidates:
+    centres = np.array([models[i].header.boundingBoxCenter[:] for i in candidates])
+    extents = np.array([models[i].header.boundingBoxExtents[:] for i in candidates])
+    viewProjection = np.reshape(renderTarget.viewMatrix, (4, 4)) @ np.reshape(renderTarget.projectionMatrix, (4, 4))
+    culled[candidates] = outside_frustum(centres, extents, np.asarray(matrices)[candidates], viewProjection,
+                                         depthPlanes)
+
+  if isinstance(renderInstances, udSDK.udRenderInstanceArray):
+    skipRender = np.ndarray((len(instances),), dtype=np.uint32, buffer=renderInstances.array,
+                            offset=udSDK.udRenderInstance.skipRender.offset,
+                            strides=(ctypes.sizeof(udSDK.udRenderInstance),))
+    skipRender[:] = culled
+  else:
+    for instance, skip in zip(instances, culled.tolist()):
+      # only changed instances are assigned so the others are not copied again by a udRenderInstanceList:
+      if instance.skipRender != skip:
+        instance.skipRender = skip
+  return int(np.count_nonzero(culled))